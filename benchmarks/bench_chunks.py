@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+--chunks benchmark: chunking cost in the pipeline vs. chunking the files afterwards.
+
+Two parts, both offline:
+
+    stages       convert_page plus MarkdownChunker.split_markdown on the fixture
+                 corpus, in-process: chunk time next to the conversion time of
+                 the same page, per page shape
+    end-to-end   convert_sitemap against the fixture server without and with
+                 --chunks, then the way embedding jobs worked so far: read every
+                 .md file back, split off the header block and chunk it
+
+Checks that every chunk stays within the token budget and that the chunks
+streamed by the run are the ones chunking the written files gives.
+
+Usage:
+    python3 benchmarks/bench_chunks.py --pages 10 --chunk-tokens 512 --chunk-overlap 64
+    python3 benchmarks/bench_chunks.py --no-end-to-end --repeat 5
+"""
+
+import argparse
+import contextlib
+import gzip
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from markdown_converter import (  # noqa: E402
+    ChunkShardWriter, DementorMarkdownConverter, HTMLCleaner, MarkdownChunker, MarkdownConverter, convert_page,
+)
+from corpus import build_corpus  # noqa: E402
+from fixture_server import FixtureServer  # noqa: E402
+
+
+def bench_stages(chunker: MarkdownChunker, per_shape: int, repeat: int, engine: str) -> List[dict]:
+    """Per shape: conversion and chunking time per page, chunks and largest chunk"""
+    cleaner, converter = HTMLCleaner(), MarkdownConverter(engine)
+    results = []
+    for shape, pages in build_corpus(per_shape).items():
+        convert_total = chunk_total = 0.0
+        chunks = largest = 0
+        for i, html in enumerate(pages):
+            body = html.encode('utf-8')
+            url = f"https://www.example.org/{shape}/{i}.html"
+            started = time.perf_counter()
+            for _ in range(repeat):
+                markdown = convert_page(body, url, cleaner, converter, None, 'utf-8')
+            convert_total += (time.perf_counter() - started) / repeat
+            started = time.perf_counter()
+            for _ in range(repeat):
+                _, page_chunks = chunker.split_markdown(markdown)
+            chunk_total += (time.perf_counter() - started) / repeat
+            chunks += len(page_chunks)
+            largest = max([largest] + [tokens for _, _, tokens in page_chunks])
+        results.append({
+            'shape': shape,
+            'convert_ms': round(convert_total / len(pages) * 1000, 2),
+            'chunk_ms': round(chunk_total / len(pages) * 1000, 3),
+            'chunk_share': round(chunk_total / convert_total, 3),
+            'chunks_per_page': round(chunks / len(pages), 1),
+            'largest_chunk': largest,
+        })
+    return results
+
+
+def read_shards(output: Path) -> Dict[str, List[str]]:
+    """{url: [chunk text, ...]} from the published chunk shards"""
+    directory = output / ChunkShardWriter.DIRNAME
+    index = json.loads((directory / ChunkShardWriter.INDEX).read_text(encoding='utf-8'))
+    pages: Dict[str, List[str]] = {}
+    for shard in index['shards']:
+        opener = gzip.open if shard['file'].endswith('.gz') else open
+        with opener(directory / shard['file'], 'rt', encoding='utf-8') as f:
+            for line in f:
+                record = json.loads(line)
+                pages.setdefault(record['url'], []).append(record['text'])
+    return pages
+
+
+def chunk_files(output: Path, chunker: MarkdownChunker) -> Dict[str, List[str]]:
+    """The old way: read every written .md file back and chunk it"""
+    metadata = json.loads((output / 'metadata.json').read_text(encoding='utf-8'))
+    pages = {}
+    for entry in metadata['files']:
+        markdown = (output / entry['filename']).read_text(encoding='utf-8')
+        pages[entry['url']] = [text for _, text, _ in chunker.split_markdown(markdown)[1]]
+    return pages
+
+
+def bench_end_to_end(chunker: MarkdownChunker, per_shape: int, concurrency: int, cpu_workers: int,
+                     engine: str) -> dict:
+    runs = {}
+    with FixtureServer(per_shape) as server, tempfile.TemporaryDirectory(prefix='dementor-chunks-') as workdir:
+        for label, run_chunker in (('markdown', None), ('markdown+chunks', chunker)):
+            output = Path(workdir) / label
+            converter = DementorMarkdownConverter(str(output), concurrency=concurrency,
+                                                  per_host_concurrency=concurrency, cpu_workers=cpu_workers,
+                                                  initial_rate=0, max_rate=0, engine=engine, chunker=run_chunker)
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                started = time.perf_counter()
+                converter.convert_sitemap(server.sitemap_url)
+                runs[label] = time.perf_counter() - started
+        started = time.perf_counter()
+        from_files = chunk_files(Path(workdir) / 'markdown', chunker)
+        read_back = time.perf_counter() - started
+        streamed = read_shards(Path(workdir) / 'markdown+chunks')
+        summary = json.loads((Path(workdir) / 'markdown+chunks' / 'metadata.json').read_text(encoding='utf-8'))
+    return {
+        'pages': len(server.page_paths),
+        'run_seconds': round(runs['markdown'], 3),
+        'run_with_chunks_seconds': round(runs['markdown+chunks'], 3),
+        'read_back_seconds': round(read_back, 3),
+        'chunks': summary['chunks'],
+        'identical': streamed == from_files,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark streaming chunks (--chunks) against chunking files afterwards')
+    parser.add_argument('--pages', type=int, default=10, help='Pages per fixture shape')
+    parser.add_argument('--repeat', type=int, default=3, help='Timing repetitions per page')
+    parser.add_argument('--chunk-tokens', type=int, default=512, help='Token budget of one chunk')
+    parser.add_argument('--chunk-overlap', type=int, default=64, help='Overlap between chunks of a split section')
+    parser.add_argument('--no-end-to-end', action='store_true', help='Only benchmark the CPU stage')
+    parser.add_argument('--concurrency', type=int, default=8, help='Concurrent fetches')
+    parser.add_argument('--cpu-workers', type=int, default=0, help='CPU worker processes (0 = inline)')
+    parser.add_argument('--engine', choices=MarkdownConverter.ENGINES, default='native', help='Markdown engine')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    chunker = MarkdownChunker(args.chunk_tokens, args.chunk_overlap)
+    results = {'stages': bench_stages(chunker, args.pages, args.repeat, args.engine), 'end_to_end': None}
+    if not args.no_end_to_end:
+        results['end_to_end'] = bench_end_to_end(chunker, args.pages, args.concurrency, args.cpu_workers,
+                                                 args.engine)
+
+    problems = [f"{r['shape']}: chunk of {r['largest_chunk']} tokens" for r in results['stages']
+                if r['largest_chunk'] > args.chunk_tokens]
+    if results['end_to_end'] and not results['end_to_end']['identical']:
+        problems.append('streamed chunks differ from chunks of the written files')
+    if args.json:
+        print(json.dumps(dict(results, problems=problems), indent=2))
+    else:
+        print(f"{'shape':<8} {'convert ms':>11} {'chunk ms':>9} {'share':>7} {'chunks':>7} {'largest':>8}")
+        for r in results['stages']:
+            print(f"{r['shape']:<8} {r['convert_ms']:>11} {r['chunk_ms']:>9} {r['chunk_share']:>7.1%} "
+                  f"{r['chunks_per_page']:>7} {r['largest_chunk']:>8}")
+        run = results['end_to_end']
+        if run:
+            print(f"🌐 {run['pages']} pages: run {run['run_seconds']}s, with --chunks {run['run_with_chunks_seconds']}s; "
+                  f"reading the files back and chunking them took {run['read_back_seconds']}s")
+            print(f"✂️ {run['chunks']['records']} chunks, {run['chunks']['tokens']} tokens in "
+                  f"{run['chunks']['shards']} shard(s)")
+        for problem in problems:
+            print(f"  ❌ {problem}")
+        print('✅ Chunks within budget and identical to chunking the files' if not problems
+              else '❌ Chunking does not check out')
+    return 0 if not problems else 1
+
+
+if __name__ == '__main__':
+    exit(main())
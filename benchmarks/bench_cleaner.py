@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+HTMLCleaner benchmark: single-pass cleaner vs. the original multi-pass cleaner.
+
+Checks that both produce byte-identical output on the fixture corpus and
+reports the per-page time for each page shape.
+
+Usage:
+    python3 benchmarks/bench_cleaner.py --pages 3 --repeat 3
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bs4 import BeautifulSoup  # noqa: E402
+
+from markdown_converter import HTMLCleaner  # noqa: E402
+from corpus import build_corpus  # noqa: E402
+
+
+class LegacyHTMLCleaner(HTMLCleaner):
+    """Reference copy of the original cleaner: one find_all per keyword, then an attribute pass"""
+
+    def extract_main_content(self, soup, selector_hits=None):
+        for selector in self.main_selectors:
+            main = soup.select_one(selector)
+            if main and len(main.get_text().strip()) > 100:
+                return main
+        divs = soup.find_all('div')
+        if divs:
+            main_div = max(divs, key=lambda div: len(div.get_text()))
+            if len(main_div.get_text().strip()) > 100:
+                return main_div
+        return soup.body or soup
+
+    def clean_html(self, html: str) -> str:
+        soup = BeautifulSoup(html, 'lxml')
+        for tag in self.unwanted_tags:
+            for element in soup.find_all(tag):
+                element.decompose()
+        for class_name in self.unwanted_classes:
+            for element in soup.find_all(class_=lambda x: x and any(
+                class_name.lower() in cls.lower() for cls in x
+            )):
+                element.decompose()
+        for id_name in self.unwanted_ids:
+            for element in soup.find_all(id=lambda x: x and id_name.lower() in x.lower()):
+                element.decompose()
+        main_content = self.extract_main_content(soup)
+        self.clean_attributes(main_content)
+        return str(main_content)
+
+
+def best_time(func, html: str, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(html)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the single-pass HTMLCleaner')
+    parser.add_argument('--pages', type=int, default=3, help='Pages per fixture shape')
+    parser.add_argument('--repeat', type=int, default=3, help='Timing repetitions per page (best is kept)')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    legacy, current = LegacyHTMLCleaner(), HTMLCleaner()
+    results = []
+    mismatches = 0
+    for shape, pages in build_corpus(args.pages).items():
+        legacy_total = current_total = 0.0
+        for html in pages:
+            if legacy.clean_html(html) != current.clean_html(html):
+                mismatches += 1
+            legacy_total += best_time(legacy.clean_html, html, args.repeat)
+            current_total += best_time(current.clean_html, html, args.repeat)
+        results.append({
+            'shape': shape,
+            'page_kb': round(sum(len(p) for p in pages) / len(pages) / 1024, 1),
+            'legacy_ms': round(legacy_total / len(pages) * 1000, 2),
+            'single_pass_ms': round(current_total / len(pages) * 1000, 2),
+            'speedup': round(legacy_total / current_total, 2),
+        })
+
+    if args.json:
+        print(json.dumps({'identical': mismatches == 0, 'results': results}, indent=2))
+    else:
+        print(f"{'shape':<8} {'KB':>7} {'legacy ms':>10} {'1-pass ms':>10} {'speedup':>8}")
+        for r in results:
+            print(f"{r['shape']:<8} {r['page_kb']:>7} {r['legacy_ms']:>10} {r['single_pass_ms']:>10} {r['speedup']:>7}x")
+        print('✅ Output byte-identical' if mismatches == 0 else f'❌ {mismatches} pages differ')
+    return 0 if mismatches == 0 else 1
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+--dedupe benchmark: boilerplate stripping and near-duplicate aliases.
+
+Two parts, both offline:
+
+    site     convert_sitemap against the fixture server serving a regional
+             site (corpus.regional_site: every article once per region),
+             without --dedupe, then twice with it (learning run, warm run).
+             Reports the time, the Markdown files and bytes written and the
+             aliases recorded for each run.
+    index    NearDuplicateIndex alone with --index-pages synthetic pages in
+             groups of near-duplicates: lookup and insert rate, resident
+             memory growth (it must stay flat: the index lives in SQLite), and
+             whether every near-duplicate was found.
+
+Usage:
+    python3 benchmarks/bench_dedupe.py --articles 20 --regions 11
+    python3 benchmarks/bench_dedupe.py --no-site --index-pages 100000
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import random
+import resource
+import struct
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from markdown_converter import DementorMarkdownConverter, NearDuplicateIndex  # noqa: E402
+from corpus import regional_site  # noqa: E402
+from fixture_server import FixtureServer  # noqa: E402
+
+
+def rss_mb() -> float:
+    """Peak resident memory of this process so far"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def output_size(output: Path):
+    files = list(output.glob('**/*.md'))
+    return len(files), sum(f.stat().st_size for f in files)
+
+
+def bench_site(articles: int, regions: int, cpu_workers: int, learn_pages: int) -> list:
+    runs = []
+    with FixtureServer(0, extra_pages=regional_site(articles, regions)) as server, \
+            tempfile.TemporaryDirectory(prefix='dementor-dedupe-') as workdir:
+        for label, dedupe, output in (('plain', False, 'plain'), ('dedupe (learning)', True, 'dedupe'),
+                                      ('dedupe (warm)', True, 'dedupe')):
+            converter = DementorMarkdownConverter(str(Path(workdir) / output), concurrency=4,
+                                                  per_host_concurrency=4, cpu_workers=cpu_workers,
+                                                  initial_rate=0, max_rate=0, dedupe=dedupe,
+                                                  dedupe_learn_pages=learn_pages)
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                started = time.perf_counter()
+                converter.convert_sitemap(server.sitemap_url)
+                elapsed = time.perf_counter() - started
+            files, size = output_size(converter.file_manager.output_dir)
+            stats = converter.file_manager.metadata['stats']
+            runs.append({
+                'run': label,
+                'pages': len(server.page_paths),
+                'seconds': round(elapsed, 3),
+                'converted': stats['successful'] - stats['unchanged'] - stats['aliases'],
+                'aliases': stats['aliases'],
+                'files': files,
+                'markdown_kb': round(size / 1024, 1),
+            })
+    return runs
+
+
+def bench_index(pages: int, group: int, seed: int = 1234) -> dict:
+    """Inserts ``pages`` synthetic signatures (groups of ``group`` near-duplicates) the way the writer does"""
+    rng = random.Random(seed)
+    size = NearDuplicateIndex.SIGNATURE_SIZE
+    pack = struct.Struct(f'<{size}I').pack
+    found = expected = 0
+    with tempfile.TemporaryDirectory(prefix='dementor-index-') as workdir:
+        index = NearDuplicateIndex(Path(workdir) / 'near_duplicates.sqlite')
+        rss_before = rss_mb()
+        started = time.perf_counter()
+        base = None
+        for i in range(pages):
+            if i % group == 0:
+                base = [rng.getrandbits(32) for _ in range(size)]
+                values = base
+            else:
+                # All but two positions agree with the group's first page
+                values = list(base)
+                for position in rng.sample(range(size), 2):
+                    values[position] = rng.getrandbits(32)
+                expected += 1
+            signature = pack(*values)
+            match = index.find('www.example.org', f'https://www.example.org/{i}', signature)
+            found += match is not None and i % group != 0
+            index.add('www.example.org', f'https://www.example.org/{i}', signature, match[0] if match else None)
+        elapsed = time.perf_counter() - started
+        index.close()
+        disk = (Path(workdir) / 'near_duplicates.sqlite').stat().st_size
+    return {
+        'pages': pages,
+        'seconds': round(elapsed, 2),
+        'pages_per_sec': round(pages / elapsed),
+        'near_duplicates_found': found,
+        'near_duplicates_expected': expected,
+        'rss_growth_mb': round(rss_mb() - rss_before, 1),
+        'index_mb': round(disk / 1e6, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark boilerplate stripping and near-duplicate aliases')
+    parser.add_argument('--articles', type=int, default=10, help='Articles on the regional fixture site')
+    parser.add_argument('--regions', type=int, default=11, help='Regions every article is published for')
+    parser.add_argument('--learn-pages', type=int, default=20, help='Pages the boilerplate is learned from')
+    parser.add_argument('--cpu-workers', type=int, default=0, help='CPU worker processes (0 = inline)')
+    parser.add_argument('--no-site', action='store_true', help='Skip the end-to-end runs')
+    parser.add_argument('--index-pages', type=int, default=20000, help='Synthetic pages for the index part (0 = skip)')
+    parser.add_argument('--group', type=int, default=10, help='Near-duplicates per group in the index part')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    results = {'site': [], 'index': None}
+    if not args.no_site:
+        results['site'] = bench_site(args.articles, args.regions, args.cpu_workers, args.learn_pages)
+    if args.index_pages:
+        results['index'] = bench_index(args.index_pages, args.group)
+
+    ok = True
+    if results['index']:
+        ok = results['index']['near_duplicates_found'] == results['index']['near_duplicates_expected']
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        if results['site']:
+            print(f"{'run':<18} {'pages':>6} {'seconds':>8} {'converted':>10} {'aliases':>8} {'files':>6} {'MD KB':>8}")
+            for r in results['site']:
+                print(f"{r['run']:<18} {r['pages']:>6} {r['seconds']:>8} {r['converted']:>10} {r['aliases']:>8} "
+                      f"{r['files']:>6} {r['markdown_kb']:>8}")
+        index = results['index']
+        if index:
+            print(f"🗂️ Index: {index['pages']} pages in {index['seconds']}s ({index['pages_per_sec']} pages/s), "
+                  f"{index['near_duplicates_found']}/{index['near_duplicates_expected']} near-duplicates found, "
+                  f"RSS +{index['rss_growth_mb']} MB, {index['index_mb']} MB on disk")
+        print('✅ Every near-duplicate found' if ok else '❌ Near-duplicates missed')
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Fetch backend benchmark: pooled keep-alive HTTP client vs. cURL subprocesses.
+
+Starts a local HTTP/1.1 keep-alive server and fetches the same page repeatedly
+through each backend's first strategy, reporting requests/sec.
+
+Usage:
+    python3 benchmarks/bench_fetch_backends.py --requests 300 --concurrency 4
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from markdown_converter import DementorHTMLFetcher, HostPoliteness  # noqa: E402
+
+PAGE = ('<html><head><title>Bench</title></head><body><main>'
+        + '<p>Lorem ipsum dolor sit amet, consectetur adipiscing elit.</p>' * 500
+        + '</main></body></html>').encode('utf-8')
+
+
+class PageHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; without this, Nagle plus
+    # delayed ACKs add ~40ms to every request on a reused connection
+    disable_nagle_algorithm = True
+    
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(PAGE)))
+        self.end_headers()
+        self.wfile.write(PAGE)
+    
+    def log_message(self, format, *args):
+        pass
+
+
+def run_backend(backend: str, base_url: str, total: int, concurrency: int) -> dict:
+    fetcher = DementorHTMLFetcher(HostPoliteness(concurrency, max_rate=0), backend=backend)
+    strategy = fetcher.strategies[DementorHTMLFetcher.BACKENDS[backend][0]]
+    user_agent, accept_language = fetcher.user_agents[0], fetcher.accept_languages[0]
+    
+    def fetch_one(i: int) -> bool:
+        return bool(strategy(f"{base_url}/page-{i}", user_agent, accept_language, {}))
+    
+    # The fetch strategies log every attempt; keep the benchmark output readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            ok = sum(pool.map(fetch_one, range(total)))
+        elapsed = time.perf_counter() - started
+    fetcher.close()
+    return {
+        'backend': backend,
+        'requests': total,
+        'successful': ok,
+        'seconds': round(elapsed, 3),
+        'requests_per_sec': round(total / elapsed, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark pooled HTTP vs. cURL fetch backends')
+    parser.add_argument('--requests', type=int, default=200, help='Requests per backend')
+    parser.add_argument('--concurrency', type=int, default=4, help='Concurrent fetches against the local host')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+    
+    server = ThreadingHTTPServer(('127.0.0.1', 0), PageHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    
+    results = [run_backend(backend, base_url, args.requests, args.concurrency)
+               for backend in ('pooled', 'curl')]
+    server.shutdown()
+    
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+    print(f"📊 {args.requests} requests per backend, concurrency {args.concurrency}, {len(PAGE)} byte page")
+    for r in results:
+        print(f"  {r['backend']:<8} {r['requests_per_sec']:>8.1f} req/s  "
+              f"({r['successful']}/{r['requests']} ok in {r['seconds']}s)")
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Markdown engine benchmark: native engine vs. markdownify.
+
+Renders the fixture corpus plus a set of edge-case snippets (nested and
+numbered lists, empty items, quotes, code, tables without header rows, images
+without alt text, whitespace runs) with both engines, checks that the native
+engine produces exactly the Markdown markdownify plus clean_markdown does, and
+reports the per-page render time for each page shape.
+
+--golden DIR compares against Markdown stored in DIR instead of running
+markdownify (write it once with --update-golden); --html adds real pages,
+e.g. from a raw HTML cache, to the comparison.
+
+Usage:
+    python3 benchmarks/bench_markdown_engine.py --pages 3 --repeat 3
+    python3 benchmarks/bench_markdown_engine.py --golden /tmp/golden --update-golden
+    python3 benchmarks/bench_markdown_engine.py --golden /tmp/golden --html page.html
+"""
+
+import argparse
+import difflib
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bs4 import BeautifulSoup  # noqa: E402
+
+from markdown_converter import HTMLCleaner, MarkdownConverter  # noqa: E402
+from corpus import build_corpus  # noqa: E402
+
+EDGE_CASES = [
+    '<ul><li>one</li><li>two<ul><li>nested <b>bold</b></li><li></li></ul></li><li>three</li></ul><p>after</p>',
+    '<ol start="3"><li>first</li>\n<li>second</li>\n \n<li><p>para</p></li></ol>',
+    '<ol start="x"><li>bad start</li></ol><ol><li>a</li><li><ol><li>deep</li></ol></li></ol>',
+    '<ul>\n  <li>  spaced\titem  </li>\n  <li>\n</li>\n</ul>',
+    '<blockquote><p>quoted <em>text</em></p><p>second</p></blockquote>',
+    '<pre><code>def f():\n    return  1\n</code></pre><p>inline <code> x </code> and <kbd>Ctrl</kbd></p>',
+    '<table><tr><td>a</td><td>b</td></tr><tr><td>c</td><td>d</td></tr></table>',
+    '<table>\n<tbody>\n<tr><th>h1</th><th>h2</th></tr>\n<tr><td>1</td><td>2</td></tr>\n</tbody>\n</table>',
+    '<table><thead><tr><th>x</th></tr></thead><tbody><tr><td><p>cell</p><br>text</td></tr></tbody></table>',
+    '<p><img src="/a.png"> <img src="/b.png" alt="B" title="say &quot;hi&quot;"> <img alt=" " src="/c(1).png"></p>',
+    '<p><a href="/x"><img src="/logo.svg"></a> <a href="/y"> </a> <a href="https://e.org">https://e.org</a></p>',
+    '<p><a>no href</a> <a href="/t" title="T">titled</a> <strong> spaced </strong><i></i></p>',
+    '<h2>Heading <a href="/h">link</a><br><img src="/i.png" alt="icon"></h2><h3>  </h3><h6>six</h6>',
+    '<div>text<h1>glued</h1>more\n\n\n\n<p></p><p>   </p>x<hr>y</div>',
+    '<p>' + 'word ' * 40 + '</p><p>\tline\nbreak  here</p><p>a' + 'x' * 90 + ' b</p>',
+    '<p>line one<br>line two</p><div>-</div><div>\n-\n</div><div>\n-\n-\n</div><div>end</div>',
+    '<p><del>gone</del> <s>struck</s> H<sub>2</sub>O x<sup>2</sup> <samp>out</samp></p>',
+    '<div><!-- comment --><span>a</span>\xa0<span>b</span><![CDATA[cdata]]></div>',
+]
+
+
+def render_tree(html: str, cleaner: HTMLCleaner):
+    soup = BeautifulSoup(html, 'lxml')
+    return cleaner.clean_soup(soup)
+
+
+def best_time(converter: MarkdownConverter, html: str, cleaner: HTMLCleaner, repeat: int) -> float:
+    """Best render time; every run gets a fresh tree (markdownify edits the tree it converts)"""
+    best = float('inf')
+    for _ in range(repeat):
+        tree = render_tree(html, cleaner)
+        started = time.perf_counter()
+        converter.render_markdown(tree)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def load_pages(per_shape: int, extra_html: List[str]) -> Dict[str, List[Tuple[str, str]]]:
+    """{shape: [(name, html), ...]} for the corpus, the edge cases and any extra pages"""
+    pages = {shape: [(f'{shape}-{i}', html) for i, html in enumerate(htmls)]
+             for shape, htmls in build_corpus(per_shape).items()}
+    pages['edge'] = [(f'edge-{i}', f'<html><body><main>{html}</main></body></html>')
+                     for i, html in enumerate(EDGE_CASES)]
+    if extra_html:
+        pages['extra'] = [(Path(path).stem, Path(path).read_text(encoding='utf-8', errors='replace'))
+                          for path in extra_html]
+    return pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare and benchmark the native Markdown engine')
+    parser.add_argument('--pages', type=int, default=3, help='Pages per fixture shape')
+    parser.add_argument('--repeat', type=int, default=3, help='Timing repetitions per page (best is kept)')
+    parser.add_argument('--golden', help='Directory of expected Markdown (<name>.md) to compare against')
+    parser.add_argument('--update-golden', action='store_true',
+                        help='Write the markdownify output to --golden instead of comparing')
+    parser.add_argument('--html', action='append', default=[], help='Extra HTML file to compare (repeatable)')
+    parser.add_argument('--show-diffs', type=int, default=3, help='Diffs to print for mismatching pages')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    cleaner = HTMLCleaner()
+    reference, native = MarkdownConverter('markdownify'), MarkdownConverter('native')
+    golden = Path(args.golden) if args.golden else None
+    if golden and args.update_golden:
+        golden.mkdir(parents=True, exist_ok=True)
+
+    results = []
+    mismatches: List[str] = []
+    diffs: List[str] = []
+    for shape, pages in load_pages(args.pages, args.html).items():
+        reference_total = native_total = 0.0
+        for name, html in pages:
+            expected_path = golden / f'{name}.md' if golden else None
+            if expected_path and not args.update_golden:
+                expected = expected_path.read_text(encoding='utf-8')
+            else:
+                expected = reference.render_markdown(render_tree(html, cleaner))
+                if expected_path:
+                    expected_path.write_text(expected, encoding='utf-8')
+            actual = native.render_markdown(render_tree(html, cleaner))
+            if actual != expected:
+                mismatches.append(name)
+                if len(diffs) < args.show_diffs:
+                    diffs.append(''.join(difflib.unified_diff(
+                        expected.splitlines(True), actual.splitlines(True), f'{name} (markdownify)',
+                        f'{name} (native)', n=1)))
+            if shape != 'edge':
+                reference_total += best_time(reference, html, cleaner, args.repeat)
+                native_total += best_time(native, html, cleaner, args.repeat)
+        if shape != 'edge':
+            results.append({
+                'shape': shape,
+                'page_kb': round(sum(len(html) for _, html in pages) / len(pages) / 1024, 1),
+                'markdownify_ms': round(reference_total / len(pages) * 1000, 2),
+                'native_ms': round(native_total / len(pages) * 1000, 2),
+                'speedup': round(reference_total / native_total, 2),
+            })
+
+    if args.json:
+        print(json.dumps({'identical': not mismatches, 'mismatches': mismatches, 'results': results}, indent=2))
+    else:
+        print(f"{'shape':<8} {'KB':>7} {'markdownify ms':>15} {'native ms':>10} {'speedup':>8}")
+        for r in results:
+            print(f"{r['shape']:<8} {r['page_kb']:>7} {r['markdownify_ms']:>15} {r['native_ms']:>10} "
+                  f"{r['speedup']:>7}x")
+        for diff in diffs:
+            print(diff)
+        if args.update_golden:
+            print(f'📝 Golden files written to {golden}')
+        print('✅ Output byte-identical' if not mismatches
+              else f"❌ {len(mismatches)} pages differ: {', '.join(mismatches)}")
+    return 0 if not mismatches else 1
+
+
+if __name__ == '__main__':
+    exit(main())
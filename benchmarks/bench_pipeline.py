@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Pipeline benchmark: per-stage and end-to-end throughput and latency.
+
+Two parts, both offline:
+
+    stages       parse / clean / markdown on the fixture corpus, in-process
+    end-to-end   convert_sitemap against the local fixture server (see
+                 fixture_server.py), once per scenario:
+                     fast      no latency, no faults
+                     latency   50ms ± 20ms per response
+                     faulty    latency plus 5% HTTP 500, 5% HTTP 429, 5% slow bodies
+
+Reports pages/sec and p50/p99 per stage and end to end. --out writes the
+results as JSON (with the commit and interpreter they were measured on);
+--compare checks them against an earlier result file and exits non-zero when
+throughput dropped by more than --tolerance.
+
+Usage:
+    python3 benchmarks/bench_pipeline.py --out bench.json
+    python3 benchmarks/bench_pipeline.py --scenario fast --compare bench.json
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from markdown_converter import (  # noqa: E402
+    DementorMarkdownConverter, HTMLCleaner, MarkdownConverter, PIPELINE_VERSION, convert_page,
+)
+from corpus import build_corpus  # noqa: E402
+from fixture_server import FaultProfile, FixtureServer  # noqa: E402
+
+SCENARIOS = {
+    'fast': FaultProfile(),
+    'latency': FaultProfile(latency_ms=50, jitter_ms=20),
+    'faulty': FaultProfile(latency_ms=50, jitter_ms=20, error_rate=0.05, rate_429=0.05, slow_rate=0.05),
+}
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """Nearest-rank percentile"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, round(q * len(ordered) + 0.5) - 1))]
+
+
+def summarize(samples: List[float]) -> dict:
+    """Latency summary in milliseconds, plus the rate one worker sustains"""
+    total = sum(samples)
+    return {
+        'count': len(samples),
+        'p50_ms': round(percentile(samples, 0.5) * 1000, 3),
+        'p99_ms': round(percentile(samples, 0.99) * 1000, 3),
+        'mean_ms': round(total / len(samples) * 1000, 3) if samples else 0.0,
+        'pages_per_sec': round(len(samples) / total, 1) if total else 0.0,
+    }
+
+
+def bench_stages(per_shape: int, repeat: int, engine: str) -> Tuple[dict, dict]:
+    """Per-stage and per-shape summaries of convert_page on the fixture corpus"""
+    cleaner, converter = HTMLCleaner(), MarkdownConverter(engine)
+    samples: Dict[str, List[float]] = {'parse': [], 'clean': [], 'markdown': [], 'total': []}
+    by_shape = {}
+    for shape, pages in build_corpus(per_shape).items():
+        shape_totals = []
+        for i, html in enumerate(pages):
+            url = f"https://www.example.org/{shape}/{i}.html"
+            # The pipeline hands the parser the raw bytes it fetched
+            body = html.encode('utf-8')
+            for _ in range(repeat):
+                timings: Dict[str, float] = {}
+                convert_page(body, url, cleaner, converter, timings, 'utf-8')
+                for stage, seconds in timings.items():
+                    samples[stage].append(seconds)
+                total = sum(timings.values())
+                samples['total'].append(total)
+                shape_totals.append(total)
+        by_shape[shape] = summarize(shape_totals)
+    return {stage: summarize(values) for stage, values in samples.items()}, by_shape
+
+
+class TimedConverter(DementorMarkdownConverter):
+    """Collects every page's stage timings as it reaches the writer"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.samples: Dict[str, List[float]] = {}
+        self.statuses: Dict[str, int] = {}
+
+    def _write_result(self, result):
+        super()._write_result(result)
+        for stage, seconds in result.timings.items():
+            self.samples.setdefault(stage, []).append(seconds)
+        self.samples.setdefault('end_to_end', []).append(time.time() - result.started)
+        status = 'failed' if result.error else 'ok'
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+
+
+def bench_end_to_end(scenario: str, per_shape: int, concurrency: int, per_host: int, cpu_workers: int,
+                     max_rate: float, engine: str) -> dict:
+    with FixtureServer(per_shape, SCENARIOS[scenario]) as server, \
+            tempfile.TemporaryDirectory(prefix='dementor-bench-') as output:
+        converter = TimedConverter(output, concurrency=concurrency, per_host_concurrency=per_host,
+                                   cpu_workers=cpu_workers, initial_rate=max_rate, max_rate=max_rate,
+                                   engine=engine)
+        # The pipeline logs every page; keep the benchmark output readable
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            started = time.perf_counter()
+            converter.convert_sitemap(server.sitemap_url)
+            elapsed = time.perf_counter() - started
+        pages = len(server.page_paths)
+        return {
+            'scenario': scenario,
+            'faults': SCENARIOS[scenario].to_dict(),
+            'pages': pages,
+            'statuses': converter.statuses,
+            'responses': server.stats,
+            'seconds': round(elapsed, 3),
+            'pages_per_sec': round(pages / elapsed, 2),
+            'host_rates': converter.politeness.summary(),
+            'stages': {stage: summarize(values) for stage, values in sorted(converter.samples.items())},
+        }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=Path(__file__).resolve().parent, timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ''
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Throughput figures that dropped by more than ``tolerance`` (a fraction) against the baseline"""
+    pairs = [(f"stages.{stage}", current['stages'].get(stage), stats)
+             for stage, stats in baseline.get('stages', {}).items()]
+    runs = {run['scenario']: run for run in current.get('end_to_end', [])}
+    for run in baseline.get('end_to_end', []):
+        pairs.append((f"end_to_end.{run['scenario']}", runs.get(run['scenario']), run))
+    regressions = []
+    for name, now, before in pairs:
+        if not now or not before.get('pages_per_sec'):
+            continue
+        change = now['pages_per_sec'] / before['pages_per_sec'] - 1
+        print(f"  {name:<28} {before['pages_per_sec']:>9} → {now['pages_per_sec']:>9} pages/s ({change:+.1%})")
+        if change < -tolerance:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the conversion pipeline per stage and end to end')
+    parser.add_argument('--pages', type=int, default=10, help='Pages per fixture shape')
+    parser.add_argument('--repeat', type=int, default=3, help='Stage timing repetitions per page')
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help='End-to-end scenario to run (repeatable; default: all)')
+    parser.add_argument('--no-end-to-end', action='store_true', help='Only benchmark the CPU stages')
+    parser.add_argument('--concurrency', type=int, default=8, help='Concurrent fetches')
+    parser.add_argument('--per-host-concurrency', type=int, default=8, help='Concurrent fetches per host')
+    parser.add_argument('--cpu-workers', type=int, default=0, help='CPU worker processes (0 = inline)')
+    parser.add_argument('--max-rate', type=float, default=0,
+                        help='Per-host rate limit for end-to-end runs, also the starting rate '
+                             '(default 0: measure the pipeline, not the politeness)')
+    parser.add_argument('--engine', choices=MarkdownConverter.ENGINES, default='markdownify',
+                        help='Markdown engine to benchmark')
+    parser.add_argument('--out', help='Write the results as JSON to this file')
+    parser.add_argument('--compare', help='Earlier result file to compare throughput against')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help='Allowed throughput drop against --compare (fraction, default 0.1)')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    stages, shapes = bench_stages(args.pages, args.repeat, args.engine)
+    results = {
+        'generated_at': datetime.now().isoformat(),
+        'commit': git_commit(),
+        'pipeline_version': PIPELINE_VERSION,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'settings': {k: v for k, v in vars(args).items() if k not in ('out', 'compare', 'json')},
+        'stages': stages,
+        'shapes': shapes,
+        'end_to_end': [],
+    }
+    if not args.no_end_to_end:
+        for scenario in args.scenario or list(SCENARIOS):
+            results['end_to_end'].append(bench_end_to_end(scenario, args.pages, args.concurrency,
+                                                          args.per_host_concurrency, args.cpu_workers,
+                                                          args.max_rate, args.engine))
+
+    if args.out:
+        Path(args.out).write_text(json.dumps(results, indent=2) + '\n', encoding='utf-8')
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"📊 Stages ({args.pages} pages per shape × {args.repeat})")
+        print(f"  {'stage':<10} {'pages/s':>9} {'p50 ms':>9} {'p99 ms':>9}")
+        for stage, stats in results['stages'].items():
+            print(f"  {stage:<10} {stats['pages_per_sec']:>9} {stats['p50_ms']:>9} {stats['p99_ms']:>9}")
+        for run in results['end_to_end']:
+            print(f"🌐 {run['scenario']}: {run['pages']} pages in {run['seconds']}s = {run['pages_per_sec']} pages/s, "
+                  f"statuses {run['statuses']}, responses {run['responses']}")
+            for stage, stats in run['stages'].items():
+                print(f"  {stage:<16} p50 {stats['p50_ms']:>9} ms  p99 {stats['p99_ms']:>9} ms")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding='utf-8'))
+        print(f"🔁 Against {args.compare} (commit {baseline.get('commit') or '?'})")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"❌ Throughput dropped more than {args.tolerance:.0%}: {', '.join(regressions)}")
+            return 1
+        print('✅ No throughput regressions')
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
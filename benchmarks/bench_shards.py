@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Sharded run benchmark: N local converter processes plus `merge`.
+
+Starts the fixture server with its pages spread over several hosts (see
+fixture_server.py --hosts), runs markdown_converter.py --shard K/N as N
+parallel processes against it, merges the shard outputs and checks the
+result: every page converted exactly once, in exactly one shard, no failures,
+and (unless --no-reference) the same Markdown as one unsharded process writes.
+
+Reports the wall time of the sharded run, the merge and the reference run.
+
+Usage:
+    python3 benchmarks/bench_shards.py --shards 4 --hosts 8
+    python3 benchmarks/bench_shards.py --shards 3 --hosts 6 --store segments --keep /tmp/shards
+"""
+
+import argparse
+import json
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from markdown_converter import export_store, shard_for_url  # noqa: E402
+from fixture_server import FixtureServer  # noqa: E402
+
+CONVERTER = Path(__file__).resolve().parent.parent / 'markdown_converter.py'
+
+
+def run_converter(args: List[str]) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, str(CONVERTER)] + args, stdout=subprocess.DEVNULL,
+                            stderr=subprocess.PIPE, text=True)
+
+
+def wait_all(processes: List[subprocess.Popen]) -> List[str]:
+    """Error output of every process that failed"""
+    errors = []
+    for process in processes:
+        _, stderr = process.communicate()
+        if process.returncode:
+            errors.append(f"exit {process.returncode}: {stderr.strip()[-500:]}")
+    return errors
+
+
+def markdown_files(output: Path) -> Dict[str, str]:
+    """{url: Markdown without the Generated line} from an output directory"""
+    with tempfile.TemporaryDirectory(prefix='dementor-flat-') as flat:
+        export_store(str(output), flat)
+        metadata = json.loads((output / 'metadata.json').read_text(encoding='utf-8'))
+        pages = {}
+        for entry in metadata['files']:
+            text = (Path(flat) / entry['filename']).read_text(encoding='utf-8')
+            pages[entry['url']] = '\n'.join(line for line in text.splitlines()
+                                            if not line.startswith('**Generated:**'))
+        return pages
+
+
+def check(output: Path, expected_urls: List[str], shards: int) -> List[str]:
+    """Problems with a merged output"""
+    problems = []
+    metadata = json.loads((output / 'metadata.json').read_text(encoding='utf-8'))
+    urls = [entry['url'] for entry in metadata['files']]
+    if len(urls) != len(set(urls)):
+        problems.append(f"{len(urls) - len(set(urls))} pages listed more than once")
+    if set(urls) != set(expected_urls):
+        problems.append(f"{len(set(expected_urls) - set(urls))} pages missing, "
+                        f"{len(set(urls) - set(expected_urls))} unexpected")
+    if metadata['stats']['failed'] or (output / 'fetch_failures.csv').exists():
+        problems.append(f"{metadata['stats']['failed']} pages failed")
+    for shard in metadata.get('shards', []):
+        index = shard['shard']['index']
+        owned = sum(1 for url in expected_urls if shard_for_url(url, shards) == index)
+        if shard['stats']['total_urls'] != owned:
+            problems.append(f"shard {index} saw {shard['stats']['total_urls']} URLs, owns {owned}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark a sharded conversion run and its merge')
+    parser.add_argument('--shards', type=int, default=4, help='Converter processes (N of --shard K/N)')
+    parser.add_argument('--hosts', type=int, default=8, help='Hosts the fixture pages are spread over')
+    parser.add_argument('--pages', type=int, default=10, help='Pages per fixture shape')
+    parser.add_argument('--concurrency', type=int, default=4, help='Concurrent fetches per process')
+    parser.add_argument('--store', choices=['dir', 'sqlite', 'segments'], default='dir', help='Page storage')
+    parser.add_argument('--no-reference', action='store_true', help='Skip the unsharded comparison run')
+    parser.add_argument('--keep', help='Write the outputs to this directory instead of a temporary one')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    common = ['--concurrency', str(args.concurrency), '--per-host-concurrency', str(args.concurrency),
+              '--max-rate', '0', '--store', args.store]
+    workdir = Path(args.keep or tempfile.mkdtemp(prefix='dementor-shards-'))
+    problems: List[str] = []
+    try:
+        with FixtureServer(args.pages, hosts=args.hosts) as server:
+            output = workdir / 'sharded'
+            started = time.perf_counter()
+            problems += wait_all([run_converter(['--sitemap', server.sitemap_url, '--output', str(output),
+                                                 '--shard', f'{k}/{args.shards}'] + common)
+                                  for k in range(1, args.shards + 1)])
+            sharded = time.perf_counter() - started
+            started = time.perf_counter()
+            problems += wait_all([run_converter(['merge', '--output', str(output)])])
+            merged = time.perf_counter() - started
+            if not problems:
+                problems += check(output, server.page_urls, args.shards)
+            single = None
+            if not args.no_reference and not problems:
+                reference = workdir / 'reference'
+                started = time.perf_counter()
+                problems += wait_all([run_converter(['--sitemap', server.sitemap_url, '--output', str(reference)]
+                                                    + common)])
+                single = time.perf_counter() - started
+                if not problems and markdown_files(output) != markdown_files(reference):
+                    problems.append('merged Markdown differs from the unsharded run')
+            per_shard = {k: sum(1 for url in server.page_urls if shard_for_url(url, args.shards) == k)
+                         for k in range(1, args.shards + 1)}
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    results = {
+        'pages': len(server.page_paths),
+        'hosts': args.hosts,
+        'shards': args.shards,
+        'pages_per_shard': per_shard,
+        'sharded_seconds': round(sharded, 3),
+        'merge_seconds': round(merged, 3),
+        'single_seconds': round(single, 3) if single is not None else None,
+        'problems': problems,
+    }
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"🧩 {results['pages']} pages on {args.hosts} hosts, {args.shards} shards "
+              f"(pages per shard: {per_shard})")
+        print(f"  sharded run {results['sharded_seconds']}s, merge {results['merge_seconds']}s"
+              + (f", single process {results['single_seconds']}s" if single is not None else ''))
+        for problem in problems:
+            print(f"  ❌ {problem}")
+        print('✅ Merged output complete and consistent' if not problems else '❌ Sharded run does not check out')
+    return 0 if not problems else 1
+
+
+if __name__ == '__main__':
+    exit(main())
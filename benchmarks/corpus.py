@@ -0,0 +1,155 @@
+"""
+Deterministic HTML fixture corpus for the converter benchmarks.
+
+Pages are generated from a fixed seed so every run (and every commit) sees
+exactly the same input. Shapes mirror what the crawler meets in practice:
+
+    small        short article with the usual header/nav/footer chrome
+    cms          regional CMS page: cookie banner, breadcrumbs, teasers, ids
+    nested       deeply nested div soup without semantic landmarks
+    tables       table-heavy price/benefit overview
+    huge         very long article with thousands of paragraphs and links
+
+regional_site() builds a separate site for the --dedupe benchmark: the same
+articles once per region, differing only in the region name, all carrying
+site-specific boilerplate blocks the cleaner's keyword lists do not catch.
+"""
+
+import random
+from typing import Dict, List
+
+WORDS = ('versicherung gesundheit leistung beratung region familie vorsorge '
+         'service antrag kosten zuschuss praxis termin online mitglied beitrag '
+         'lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod').split()
+
+
+def _sentence(rng: random.Random, words: int = 14) -> str:
+    text = ' '.join(rng.choice(WORDS) for _ in range(words))
+    return text.capitalize() + '.'
+
+
+def _paragraph(rng: random.Random, sentences: int = 4) -> str:
+    return ' '.join(_sentence(rng) for _ in range(sentences))
+
+
+def _chrome(rng: random.Random, body: str, title: str) -> str:
+    nav = ''.join(f'<li><a href="/section-{i}" class="nav-link">Bereich {i}</a></li>' for i in range(12))
+    return f"""<!DOCTYPE html>
+<html lang="de">
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<meta property="og:title" content="{title} | Portal">
+<link rel="canonical" href="https://www.example.org/{title.lower().replace(' ', '-')}">
+<style>.x{{color:red}}</style>
+<script>window.dataLayer = [];</script>
+</head>
+<body class="page page-{rng.randint(1, 99)}">
+<div id="cookie-consent" class="cookie-banner"><p>Wir verwenden Cookies.</p><button>OK</button></div>
+<header class="site-header"><div class="logo"><a href="/"><img src="/logo.svg" alt="Logo"></a></div>
+<nav class="main-navigation"><ul>{nav}</ul></nav></header>
+<div id="page-wrapper" class="wrapper" data-track="1">
+{body}
+</div>
+<aside class="sidebar"><h3>Kontakt</h3><p>{_sentence(rng)}</p></aside>
+<footer id="footer"><p>&copy; Example</p><a href="/impressum">Impressum</a></footer>
+<script src="/app.js"></script>
+</body>
+</html>
+"""
+
+
+def small_page(rng: random.Random) -> str:
+    body = (f'<main id="main" class="main-content" role="main"><article><h1>{_sentence(rng, 5)}</h1>'
+            + ''.join(f'<p style="margin:0">{_paragraph(rng)}</p>' for _ in range(4))
+            + '</article></main>')
+    return _chrome(rng, body, 'Kleine Seite')
+
+
+def cms_page(rng: random.Random) -> str:
+    teasers = ''.join(
+        f'<div class="teaser teaser--{i}" id="teaser-{i}"><h3>{_sentence(rng, 4)}</h3>'
+        f'<p>{_paragraph(rng, 2)}</p><a href="/mehr/{i}" title="Mehr">Mehr erfahren</a></div>'
+        for i in range(10))
+    body = (f'<div class="breadcrumb"><a href="/">Start</a> / <a href="/leistungen">Leistungen</a></div>'
+            f'<div class="content"><h1>{_sentence(rng, 6)}</h1><p>{_paragraph(rng, 6)}</p>'
+            f'<div id="social-share"><a href="https://share.example">Teilen</a></div>'
+            f'{teasers}<div id="comments"><p>{_sentence(rng)}</p></div>'
+            f'<form action="/suche"><input name="q"><button>Suchen</button></form></div>')
+    return _chrome(rng, body, 'Regionale Leistungen')
+
+
+def nested_page(rng: random.Random, depth: int = 60, breadth: int = 3) -> str:
+    def block(level: int) -> str:
+        if level == depth:
+            return f'<p>{_paragraph(rng, 2)}</p>'
+        inner = block(level + 1)
+        siblings = ''.join(f'<div class="col col-{level}-{j}"><span>{_sentence(rng, 6)}</span></div>'
+                           for j in range(breadth))
+        return f'<div class="row row-{level}"><div class="inner">{inner}</div>{siblings}</div>'
+    return _chrome(rng, block(0), 'Verschachtelte Seite')
+
+
+def table_page(rng: random.Random, tables: int = 8, rows: int = 40) -> str:
+    parts = [f'<article><h1>{_sentence(rng, 5)}</h1>']
+    for t in range(tables):
+        parts.append(f'<h2>Tabelle {t}</h2><table class="pricing" border="1"><thead><tr>'
+                     + ''.join(f'<th scope="col">Spalte {c}</th>' for c in range(6)) + '</tr></thead><tbody>')
+        for _ in range(rows):
+            parts.append('<tr>' + ''.join(f'<td class="cell">{rng.choice(WORDS)} {rng.randint(1, 999)}&nbsp;€</td>'
+                                          for _ in range(6)) + '</tr>')
+        parts.append('</tbody></table>')
+    parts.append('</article>')
+    return _chrome(rng, ''.join(parts), 'Tabellen')
+
+
+def huge_page(rng: random.Random, sections: int = 400) -> str:
+    parts = [f'<main><h1>{_sentence(rng, 6)}</h1>']
+    for s in range(sections):
+        parts.append(f'<section id="s{s}"><h2>{_sentence(rng, 5)}</h2>'
+                     f'<p>{_paragraph(rng, 5)} <a href="/ref/{s}">Quelle {s}</a></p>'
+                     f'<ul>' + ''.join(f'<li>{_sentence(rng, 6)}</li>' for _ in range(3)) + '</ul></section>')
+    parts.append('</main>')
+    return _chrome(rng, ''.join(parts), 'Riesige Seite')
+
+
+REGIONS = ('Bayern', 'Baden-Württemberg', 'Nordost', 'Nordwest', 'Hessen', 'Rheinland-Hamburg', 'Niedersachsen',
+           'Plus', 'Bremen-Bremerhaven', 'Rheinland-Pfalz-Saarland', 'Sachsen-Anhalt')
+
+
+def regional_site(articles: int = 10, regions: int = 11, seed: int = 1234) -> Dict[str, str]:
+    """{path: html}: every article once per region, same text apart from the region name"""
+    rng = random.Random(f'{seed}-regional')
+    service = (f'<div class="service-box"><h3>Ihr persönlicher Service</h3><p>{_paragraph(rng, 2)}</p>'
+               f'<p>Montag bis Freitag von 8 bis 18 Uhr, kostenfrei aus allen deutschen Netzen.</p></div>')
+    notice = f'<p class="hint">Hinweis: {_paragraph(rng, 1)}</p>'
+    pages = {}
+    for a in range(articles):
+        title = _sentence(rng, 5)
+        paragraphs = [_paragraph(rng) for _ in range(5)]
+        for region in REGIONS[:regions]:
+            body = (f'<main><article><h1>{title} – AOK {region}</h1>'
+                    + f'<p>Was gilt in {region}? {paragraphs[0]}</p>'
+                    + ''.join(f'<p>{p}</p>' for p in paragraphs[1:])
+                    + f'<p>Die AOK {region} berät Sie gern.</p>{service}{notice}</article></main>')
+            slug = region.lower().replace('ü', 'ue')
+            pages[f'/pk/{slug}/artikel-{a}.html'] = _chrome(rng, body, f'Artikel {a} {region}')
+    return pages
+
+
+SHAPES = {
+    'small': small_page,
+    'cms': cms_page,
+    'nested': nested_page,
+    'tables': table_page,
+    'huge': huge_page,
+}
+
+
+def build_corpus(per_shape: int = 3, seed: int = 1234) -> Dict[str, List[str]]:
+    """Returns {shape: [html, ...]} with ``per_shape`` deterministic pages per shape"""
+    corpus = {}
+    for shape, builder in SHAPES.items():
+        rng = random.Random(f'{seed}-{shape}')
+        corpus[shape] = [builder(rng) for _ in range(per_shape)]
+    return corpus
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Local stand-in web server for the offline benchmarks.
+
+Serves the fixture corpus (see corpus.py) plus a sitemap listing every page,
+with configurable misbehaviour so the fetch side can be measured without
+touching a real site:
+
+    latency      fixed delay before the response starts, plus random jitter
+    error rate   share of requests answered with HTTP 500
+    429 rate     share of requests answered with HTTP 429 and a Retry-After header
+    slow bodies  share of responses whose body trickles out at a capped rate
+
+Faults are drawn from a seeded RNG, so a run with the same settings and the
+same request order sees the same faults.
+
+With --hosts N the corpus is spread over N sites: the server also listens on
+N - 1 further ports, and the sitemap hands out the pages round-robin across
+them, so each port is a host of its own to the converter (politeness, circuit
+breaker, --shard).
+
+Usage:
+    python3 benchmarks/fixture_server.py --port 8765 --latency-ms 50 --error-rate 0.05 --rate-429 0.05
+    python3 benchmarks/fixture_server.py --port 8765 --hosts 8
+"""
+
+import argparse
+import random
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+from typing import Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from corpus import build_corpus  # noqa: E402
+
+
+class FaultProfile:
+    """How the fixture server misbehaves"""
+
+    __slots__ = ('latency_ms', 'jitter_ms', 'error_rate', 'rate_429', 'retry_after', 'slow_rate', 'slow_kbps')
+
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0, error_rate: float = 0, rate_429: float = 0,
+                 retry_after: int = 1, slow_rate: float = 0, slow_kbps: float = 64):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.slow_rate = slow_rate
+        self.slow_kbps = slow_kbps
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; without this, Nagle plus
+    # delayed ACKs add ~40ms to every request on a reused connection
+    disable_nagle_algorithm = True
+    server: 'FixtureServer'
+
+    def do_GET(self):
+        body = self.server.pages.get(self.path.split('?', 1)[0])
+        if body is None:
+            self._respond(404, b'Not found', 'text/plain')
+            return
+        if self.path.endswith('.xml'):
+            # The sitemap itself is served reliably: the faults are meant for the page fetches
+            self._respond(200, body, 'application/xml')
+            return
+        fault, delay, slow = self.server.draw_fault()
+        if delay > 0:
+            time.sleep(delay)
+        if fault == 500:
+            self._respond(500, b'Internal Server Error', 'text/plain')
+        elif fault == 429:
+            self._respond(429, b'Too Many Requests', 'text/plain',
+                          {'Retry-After': str(self.server.faults.retry_after)})
+        else:
+            self._respond(200, body, 'text/html; charset=utf-8', slow=slow)
+
+    def _respond(self, status: int, body: bytes, content_type: str, headers: Optional[Dict[str, str]] = None,
+                 slow: bool = False):
+        self.server.count(status, slow)
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if not slow:
+            self.wfile.write(body)
+            return
+        chunk = 4096
+        pause = chunk / (self.server.faults.slow_kbps * 1024)
+        for start in range(0, len(body), chunk):
+            self.wfile.write(body[start:start + chunk])
+            self.wfile.flush()
+            time.sleep(pause)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FixtureMirror(ThreadingHTTPServer):
+    """Further port of a multi-host fixture server: same pages, faults and counters"""
+
+    daemon_threads = True
+
+    def __init__(self, primary: 'FixtureServer'):
+        self.primary = primary
+        super().__init__(('127.0.0.1', 0), FixtureHandler)
+
+    def __getattr__(self, name):
+        return getattr(self.primary, name)
+
+
+class FixtureServer(ThreadingHTTPServer):
+    """Threaded HTTP server for the fixture corpus; use as a context manager"""
+
+    daemon_threads = True
+
+    def __init__(self, per_shape: int = 20, faults: Optional[FaultProfile] = None, port: int = 0,
+                 seed: int = 1234, hosts: int = 1, extra_pages: Optional[Dict[str, str]] = None):
+        super().__init__(('127.0.0.1', port), FixtureHandler)
+        self.faults = faults or FaultProfile()
+        self.base_url = f"http://127.0.0.1:{self.server_address[1]}"
+        self.mirrors = [FixtureMirror(self) for _ in range(max(1, hosts) - 1)]
+        self.base_urls: List[str] = [self.base_url] + [f"http://127.0.0.1:{mirror.server_address[1]}"
+                                                       for mirror in self.mirrors]
+        self.pages: Dict[str, bytes] = {}
+        for shape, pages in build_corpus(per_shape, seed).items():
+            for i, html in enumerate(pages):
+                self.pages[f'/{shape}/{i}.html'] = html.encode('utf-8')
+        for path, html in (extra_pages or {}).items():
+            self.pages[path] = html.encode('utf-8')
+        self.page_paths = sorted(self.pages)
+        self.pages['/sitemap.xml'] = self._sitemap().encode('utf-8')
+        self.stats: Dict[str, int] = {}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._serve_threads: List[threading.Thread] = []
+
+    @property
+    def page_urls(self) -> List[str]:
+        """Every page URL in the sitemap; pages are spread round-robin over the hosts"""
+        return [f'{self.base_urls[i % len(self.base_urls)]}{path}' for i, path in enumerate(self.page_paths)]
+
+    def _sitemap(self) -> str:
+        urls = ''.join(f'<url><loc>{url}</loc></url>' for url in self.page_urls)
+        return ('<?xml version="1.0" encoding="UTF-8"?>'
+                f'<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{urls}</urlset>')
+
+    @property
+    def sitemap_url(self) -> str:
+        return f"{self.base_url}/sitemap.xml"
+
+    def draw_fault(self):
+        """(status override or None, delay in seconds, slow body?) for the next request"""
+        faults = self.faults
+        with self._lock:
+            jitter = self._rng.uniform(0, faults.jitter_ms) if faults.jitter_ms else 0
+            roll = self._rng.random()
+            slow = self._rng.random() < faults.slow_rate
+        fault = None
+        if roll < faults.error_rate:
+            fault = 500
+        elif roll < faults.error_rate + faults.rate_429:
+            fault = 429
+        return fault, (faults.latency_ms + jitter) / 1000, slow and fault is None
+
+    def count(self, status: int, slow: bool):
+        with self._lock:
+            self.stats[str(status)] = self.stats.get(str(status), 0) + 1
+            if slow:
+                self.stats['slow'] = self.stats.get('slow', 0) + 1
+
+    def __enter__(self):
+        for i, server in enumerate([self] + self.mirrors):
+            thread = threading.Thread(target=server.serve_forever, name=f'fixture-server-{i}', daemon=True)
+            thread.start()
+            self._serve_threads.append(thread)
+        return self
+
+    def __exit__(self, *exc):
+        for server in [self] + self.mirrors:
+            server.shutdown()
+            server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve the benchmark fixture corpus with simulated faults')
+    parser.add_argument('--port', type=int, default=8765, help='Port to listen on (127.0.0.1)')
+    parser.add_argument('--pages', type=int, default=20, help='Pages per fixture shape')
+    parser.add_argument('--latency-ms', type=float, default=0, help='Delay before every response')
+    parser.add_argument('--jitter-ms', type=float, default=0, help='Random extra delay, up to this much')
+    parser.add_argument('--error-rate', type=float, default=0, help='Share of requests answered with HTTP 500')
+    parser.add_argument('--rate-429', type=float, default=0, help='Share of requests answered with HTTP 429')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After seconds sent with 429s')
+    parser.add_argument('--slow-rate', type=float, default=0, help='Share of bodies sent slowly')
+    parser.add_argument('--hosts', type=int, default=1,
+                        help='Spread the pages over this many hosts (--port plus ports picked by the OS)')
+    parser.add_argument('--slow-kbps', type=float, default=64, help='Transfer rate of slow bodies (KiB/s)')
+    args = parser.parse_args()
+
+    faults = FaultProfile(args.latency_ms, args.jitter_ms, args.error_rate, args.rate_429, args.retry_after,
+                          args.slow_rate, args.slow_kbps)
+    with FixtureServer(args.pages, faults, port=args.port, hosts=args.hosts) as server:
+        print(f"🧪 Serving {len(server.page_paths)} fixture pages on {len(server.base_urls)} hosts, "
+              f"sitemap: {server.sitemap_url}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+    print(f"📊 Responses: {server.stats}")
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
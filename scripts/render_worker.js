@@ -0,0 +1,236 @@
+#!/usr/bin/env node
+/**
+ * Long-lived Puppeteer render worker.
+ *
+ * Keeps one headless browser with a pool of tabs and renders URLs on request.
+ * Speaks line-delimited JSON on stdin/stdout (stdout carries protocol only,
+ * diagnostics go to stderr):
+ *
+ *   → {"id": 1, "url": "https://…", "timeout": 60000, "userAgent": "…", "acceptLanguage": "…"}
+ *   ← {"id": 1, "ok": true, "html": "<html>…"}
+ *   ← {"id": 1, "ok": false, "error": "…"}
+ *   → {"cmd": "shutdown"}
+ *
+ * Usage: node scripts/render_worker.js [--tabs 4] [--max-pages 200] [--max-rss-mb 1500]
+ */
+const { execFileSync } = require('child_process');
+const readline = require('readline');
+const puppeteer = require('puppeteer');
+
+const DEFAULT_USER_AGENT =
+  'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36';
+const DEFAULT_ACCEPT_LANGUAGE = 'de-DE,de;q=0.9,en;q=0.8';
+
+function parseArgs(argv) {
+  const options = { tabs: 4, maxPages: 200, maxRssMb: 1500 };
+  for (let i = 0; i < argv.length; i += 1) {
+    const value = Number(argv[i + 1]);
+    if (argv[i] === '--tabs') options.tabs = Math.max(1, value);
+    if (argv[i] === '--max-pages') options.maxPages = Math.max(1, value);
+    if (argv[i] === '--max-rss-mb') options.maxRssMb = Math.max(1, value);
+  }
+  return options;
+}
+
+const options = parseArgs(process.argv.slice(2));
+
+let browser = null;
+let pagesSinceLaunch = 0;
+let activeJobs = 0;
+let restartReason = null;
+let shuttingDown = false;
+let pumping = false;
+let pumpAgain = false;
+const idleTabs = [];
+const waitingJobs = [];
+
+function send(message) {
+  process.stdout.write(`${JSON.stringify(message)}\n`);
+}
+
+// Resident memory of the browser process tree in MB (Chromium spawns many children)
+function browserRssMb() {
+  const proc = browser && browser.process();
+  if (!proc || !proc.pid) return 0;
+  try {
+    const rows = execFileSync('ps', ['-axo', 'pid=,ppid=,rss='], { encoding: 'utf8' })
+      .trim()
+      .split('\n')
+      .map(line => line.trim().split(/\s+/).map(Number));
+    const tree = new Set([proc.pid]);
+    let grew = true;
+    while (grew) {
+      grew = false;
+      rows.forEach(([pid, ppid]) => {
+        if (tree.has(ppid) && !tree.has(pid)) {
+          tree.add(pid);
+          grew = true;
+        }
+      });
+    }
+    const rssKb = rows.reduce((sum, [pid, , rss]) => (tree.has(pid) ? sum + rss : sum), 0);
+    return rssKb / 1024;
+  } catch (err) {
+    return 0;
+  }
+}
+
+async function launchBrowser() {
+  browser = await puppeteer.launch({
+    headless: 'new',
+    args: [
+      '--no-sandbox',
+      '--disable-setuid-sandbox',
+      '--disable-dev-shm-usage',
+      '--disable-gpu',
+      '--window-size=1280,800'
+    ]
+  });
+  pagesSinceLaunch = 0;
+  idleTabs.length = 0;
+  for (let i = 0; i < options.tabs; i += 1) {
+    const page = await browser.newPage();
+    await page.setViewport({ width: 1280, height: 800 });
+    idleTabs.push(page);
+  }
+  console.error(`🎭 Render worker: browser ready with ${options.tabs} tabs`);
+}
+
+async function closeBrowser() {
+  const old = browser;
+  browser = null;
+  idleTabs.length = 0;
+  if (old) {
+    try {
+      await old.close();
+    } catch (_) {}
+  }
+}
+
+function needsRestart() {
+  if (pagesSinceLaunch >= options.maxPages) return `${pagesSinceLaunch} pages rendered`;
+  const rss = browserRssMb();
+  if (rss > options.maxRssMb) return `RSS ${Math.round(rss)} MB`;
+  return null;
+}
+
+// Serializes dispatching; calls made while a dispatch is running trigger one more round
+async function pump() {
+  if (pumping) {
+    pumpAgain = true;
+    return;
+  }
+  pumping = true;
+  try {
+    do {
+      pumpAgain = false;
+      await dispatch();
+    } while (pumpAgain);
+  } finally {
+    pumping = false;
+  }
+}
+
+// Hands idle tabs to waiting jobs, restarting the browser once it has drained when due
+async function dispatch() {
+  if (shuttingDown || waitingJobs.length === 0) return;
+  if (browser && !restartReason) restartReason = needsRestart();
+  if (restartReason) {
+    if (activeJobs > 0) return;
+    console.error(`♻️ Render worker: restarting browser (${restartReason})`);
+    await closeBrowser();
+    restartReason = null;
+  }
+  if (!browser) {
+    try {
+      await launchBrowser();
+    } catch (err) {
+      browser = null;
+      waitingJobs.splice(0).forEach(job =>
+        send({ id: job.id, ok: false, error: `Browser launch failed: ${err.message || err}` })
+      );
+      return;
+    }
+  }
+  while (idleTabs.length > 0 && waitingJobs.length > 0) {
+    const page = idleTabs.pop();
+    const job = waitingJobs.shift();
+    activeJobs += 1;
+    pagesSinceLaunch += 1;
+    render(page, job).finally(() => {
+      activeJobs -= 1;
+      pump();
+    });
+    if (pagesSinceLaunch >= options.maxPages) {
+      restartReason = `${pagesSinceLaunch} pages rendered`;
+      break;
+    }
+  }
+}
+
+async function render(page, job) {
+  const currentBrowser = browser;
+  try {
+    await page.setUserAgent(job.userAgent || DEFAULT_USER_AGENT);
+    await page.setExtraHTTPHeaders({
+      'Accept-Language': job.acceptLanguage || DEFAULT_ACCEPT_LANGUAGE
+    });
+    await page.goto(job.url, { waitUntil: 'networkidle2', timeout: job.timeout || 60000 });
+    // Give client-side rendering a bit of time
+    await new Promise(resolve => setTimeout(resolve, 1000));
+    const html = await page.content();
+    send({ id: job.id, ok: true, html });
+  } catch (err) {
+    send({ id: job.id, ok: false, error: (err && err.message) || String(err) });
+  }
+  // Recycle the tab: drop the page state, or replace the tab if it is broken
+  if (browser !== currentBrowser) return;
+  try {
+    await page.goto('about:blank');
+    idleTabs.push(page);
+  } catch (_) {
+    try {
+      await page.close();
+    } catch (__) {}
+    try {
+      const fresh = await browser.newPage();
+      await fresh.setViewport({ width: 1280, height: 800 });
+      idleTabs.push(fresh);
+    } catch (__) {}
+  }
+}
+
+async function shutdown(code) {
+  if (shuttingDown) return;
+  shuttingDown = true;
+  waitingJobs.splice(0).forEach(job => send({ id: job.id, ok: false, error: 'Render worker shutting down' }));
+  await closeBrowser();
+  process.exit(code);
+}
+
+const input = readline.createInterface({ input: process.stdin });
+
+input.on('line', line => {
+  if (!line.trim()) return;
+  let message;
+  try {
+    message = JSON.parse(line);
+  } catch (err) {
+    console.error(`⚠️ Render worker: ignoring malformed line: ${err.message}`);
+    return;
+  }
+  if (message.cmd === 'shutdown') {
+    shutdown(0);
+    return;
+  }
+  if (!message.url) {
+    send({ id: message.id, ok: false, error: 'Missing url' });
+    return;
+  }
+  waitingJobs.push(message);
+  pump();
+});
+
+// Parent went away: close the browser instead of leaving it orphaned
+input.on('close', () => shutdown(0));
+process.on('SIGTERM', () => shutdown(0));
@@ -0,0 +1,25 @@
+import contextlib
+import io
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+# markdown_converter is a single module at the repo root; the fixture server lives with the benchmarks
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / 'benchmarks'))
+
+from markdown_converter import DementorMarkdownConverter  # noqa: E402
+
+
+@pytest.fixture
+def convert():
+    """Runs a conversion with its console output captured; returns the converter"""
+    def run(output: Path, sitemap: str, **options) -> DementorMarkdownConverter:
+        options = dict(dict(concurrency=4, per_host_concurrency=4, initial_rate=0, max_rate=0), **options)
+        converter = DementorMarkdownConverter(str(output), **options)
+        with contextlib.redirect_stdout(io.StringIO()):
+            converter.convert_sitemap(sitemap)
+        return converter
+    return run
@@ -0,0 +1,63 @@
+"""Charset sniffing of fetched pages (BOM, Content-Type, <meta>, undeclared bytes)"""
+
+import pytest
+
+from markdown_converter import UTF8_SNIFF_BYTES, FetchResult, sniff_encoding
+
+HTML = '<html><head><title>Café</title></head><body><p>Grüße aus Köln</p></body></html>'
+
+
+def test_bom_wins_over_declarations():
+    data = b'\xef\xbb\xbf<meta charset="iso-8859-1">' + HTML.encode('utf-8')
+    assert sniff_encoding(data, 'text/html; charset=windows-1251') == 'utf-8'
+    assert sniff_encoding('﻿'.encode('utf-16le') + HTML.encode('utf-16le')) == 'utf-16le'
+    assert sniff_encoding('﻿'.encode('utf-16be') + HTML.encode('utf-16be')) == 'utf-16be'
+
+
+def test_header_charset_wins_over_meta():
+    data = b'<meta charset="utf-8">' + '<p>Привет</p>'.encode('koi8-r')
+    assert sniff_encoding(data, 'text/html; charset="KOI8-R"') == 'koi8-r'
+
+
+def test_unknown_header_charset_falls_through_to_meta():
+    data = b'<meta http-equiv="Content-Type" content="text/html; charset=shift_jis">' + '<p>日本語</p>'.encode('shift_jis')
+    assert sniff_encoding(data, 'text/html; charset=x-no-such-charset') == 'shift_jis'
+
+
+@pytest.mark.parametrize('meta', [b'<meta charset="windows-1251">', b"<META CHARSET='windows-1251'>",
+                                  b'<meta http-equiv="content-type" content="text/html; charset=windows-1251">'])
+def test_meta_charset(meta):
+    assert sniff_encoding(b'<html><head>' + meta + b'</head><body>\xcf\xf0\xe8\xe2\xe5\xf2</body>') == 'windows-1251'
+
+
+def test_meta_beyond_sniff_window_is_ignored():
+    data = b'<html><head>' + b' ' * 5000 + b'<meta charset="windows-1251"></head>'
+    assert sniff_encoding(data) == 'utf-8'
+
+
+def test_meta_utf16_means_utf8():
+    assert sniff_encoding(b'<meta charset="utf-16">' + HTML.encode('utf-8')) == 'utf-8'
+
+
+@pytest.mark.parametrize('label', ['iso-8859-1', 'ISO-8859-1', 'latin1', 'us-ascii'])
+def test_latin1_labels_decode_as_windows_1252(label):
+    assert sniff_encoding(HTML.encode('latin-1'), f'text/html; charset={label}') == 'windows-1252'
+    # Bytes 0x80-0x9f are printable characters in windows-1252, as in browsers
+    result = FetchResult(b'<p>\x93quoted\x94 \x80 5</p>', 200, {'content-type': f'text/html; charset={label}'})
+    assert result.html == '<p>“quoted” € 5</p>'
+
+
+def test_undeclared_pages():
+    assert sniff_encoding(HTML.encode('utf-8')) == 'utf-8'
+    assert sniff_encoding(HTML.encode('latin-1')) == 'windows-1252'
+    assert sniff_encoding(b'<p>plain ASCII</p>') == 'utf-8'
+    assert sniff_encoding(b'') == 'utf-8'
+
+
+def test_undeclared_window_starts_at_first_non_ascii_byte():
+    # A long ASCII head does not use up the window
+    assert sniff_encoding(b' ' * (2 * UTF8_SNIFF_BYTES) + HTML.encode('latin-1')) == 'windows-1252'
+    # A multi-byte character cut off by the window is not an error
+    data = b'<p>' + 'é'.encode('utf-8') + 'x€'.encode('utf-8') * UTF8_SNIFF_BYTES
+    assert sniff_encoding(data[:UTF8_SNIFF_BYTES + 5]) == 'utf-8'
+    assert sniff_encoding(data) == 'utf-8'
@@ -0,0 +1,178 @@
+"""--chunks: token budget and overlap, headings and fenced code, shard rotation"""
+
+import gzip
+import json
+
+import pytest
+
+from corpus import build_corpus
+from fixture_server import FixtureServer
+from markdown_converter import (
+    ChunkShardWriter, HTMLCleaner, MarkdownChunker, MarkdownConverter, TokenCounter, convert_page,
+)
+
+
+def words(count: int, prefix: str = 'w') -> str:
+    return ' '.join(f'{prefix}{i}' for i in range(count))
+
+
+@pytest.fixture(scope='module')
+def corpus_markdown():
+    cleaner, converter = HTMLCleaner(), MarkdownConverter('native')
+    return [convert_page(html.encode('utf-8'), f'https://www.example.org/{shape}/{i}.html', cleaner, converter,
+                         None, 'utf-8')
+            for shape, pages in build_corpus(2).items() for i, html in enumerate(pages)]
+
+
+def test_estimate_is_chars_over_four_or_words():
+    counter = TokenCounter()
+    assert counter.count('abcdefghijklmnop') == 4
+    assert counter.count('a b c d e f') == 6
+    assert counter.count('a\nb\nc') == 3
+    # Every window of split() and the tail fit the budget
+    text = words(500) + ' ' + 'x' * 300
+    assert all(counter.count(piece) <= 50 for piece in counter.split(text, 50))
+    assert ''.join(counter.split(text, 50)).replace(' ', '') == text.replace(' ', '')
+    assert counter.count(counter.tail(text, 20)) <= 20
+
+
+def test_settings_are_validated():
+    with pytest.raises(ValueError):
+        MarkdownChunker(max_tokens=8)
+    with pytest.raises(ValueError):
+        MarkdownChunker(max_tokens=100, overlap=51)
+    with pytest.raises(ValueError):
+        MarkdownChunker(tokenizer='no-such-encoding')
+
+
+@pytest.mark.parametrize('max_tokens,overlap', [(16, 0), (64, 16), (256, 32), (512, 64)])
+def test_every_chunk_stays_within_budget(corpus_markdown, max_tokens, overlap):
+    chunker = MarkdownChunker(max_tokens, overlap)
+    for markdown in corpus_markdown:
+        _, chunks = chunker.split_markdown(markdown)
+        assert chunks
+        for _, text, tokens in chunks:
+            assert tokens == chunker.counter.count(text)
+            assert 0 < tokens <= max_tokens
+
+
+def test_long_section_chunks_overlap():
+    chunker = MarkdownChunker(max_tokens=64, overlap=16)
+    paragraphs = [words(10, f'p{i}-') for i in range(30)]
+    chunks = chunker.chunks('## Long\n\n' + '\n\n'.join(paragraphs))
+    assert len(chunks) > 2
+    for (_, before, _), (_, after, _) in zip(chunks, chunks[1:]):
+        # The next chunk starts with the last paragraph(s) of the one before
+        first = after.split('\n\n')[0]
+        assert before.endswith(first)
+        carried = sum(chunker.counter.count(p) + 1 for p in after.split('\n\n') if p in before.split('\n\n'))
+        assert carried <= 16
+    # Nothing is lost
+    text = '\n\n'.join(text for _, text, _ in chunks)
+    assert all(paragraph in text for paragraph in paragraphs)
+
+
+def test_without_overlap_every_paragraph_appears_once():
+    chunker = MarkdownChunker(max_tokens=64, overlap=0)
+    paragraphs = [words(10, f'p{i}-') for i in range(30)]
+    chunks = chunker.chunks('\n\n'.join(paragraphs))
+    assert [p for _, text, _ in chunks for p in text.split('\n\n')] == paragraphs
+
+
+def test_heading_paths():
+    body = ('# Guide\n\nIntro text.\n\n## Install\n\n' + words(60, 'i') + '\n\n### Linux\n\n' + words(60, 'l')
+            + '\n\n## Usage\n\n' + words(60, 'u'))
+    chunks = MarkdownChunker(max_tokens=80, overlap=0).chunks(body)
+    # The intro fits in with Install: the chunk sits under the heading both are below
+    assert [headings for headings, _, _ in chunks] == [['Guide'], ['Guide', 'Install', 'Linux'], ['Guide', 'Usage']]
+    assert chunks[1][1].startswith('### Linux') and chunks[2][1].startswith('## Usage')
+    # Small sections share a chunk under the headings they have in common
+    small = MarkdownChunker(max_tokens=512, overlap=0).chunks(body)
+    assert len(small) == 1 and small[0][0] == ['Guide']
+
+
+def test_headings_inside_fenced_code_are_code():
+    body = ('## Setup\n\nRun this:\n\n```sh\n# install the package\npip install dementor\n~~~\n# still code\n```\n\n'
+            '~~~\n```\n# also code\n~~~\n\n## Next\n\nDone.')
+    chunks = MarkdownChunker(max_tokens=16, overlap=0).chunks(body)
+    assert {tuple(headings) for headings, _, _ in chunks} == {('Setup',), ('Next',)}
+    text = '\n\n'.join(text for headings, text, _ in chunks if headings == ['Setup'])
+    assert '# install the package' in text and '# still code' in text and '# also code' in text
+
+
+def test_split_header():
+    markdown = '# Title\n\n**Source URL:** https://www.example.org/\n\n---\n\nBody text.'
+    assert MarkdownChunker.split_header(markdown) == ('Title', 'Body text.')
+    assert MarkdownChunker.split_header('No header here.') == ('', 'No header here.')
+
+
+def read_shards(directory):
+    index = json.loads((directory / ChunkShardWriter.INDEX).read_text(encoding='utf-8'))
+    shards = []
+    for shard in index['shards']:
+        opener = gzip.open if shard['file'].endswith('.gz') else open
+        with opener(directory / shard['file'], 'rt', encoding='utf-8') as f:
+            shards.append([json.loads(line) for line in f])
+    return index, shards
+
+
+@pytest.mark.parametrize('compress', [True, False])
+def test_shards_rotate_between_pages(tmp_path, compress):
+    chunker = MarkdownChunker(max_tokens=32, overlap=8)
+    writer = ChunkShardWriter(tmp_path, chunker.settings(), compress=compress, max_bytes=2000)
+    for page in range(12):
+        chunks = chunker.chunks('\n\n'.join(words(12, f'page{page}-{i}-') for i in range(page % 4 + 1)))
+        assert writer.write_page(f'https://www.example.org/{page}', f'Page {page}', chunks) == len(chunks)
+    assert writer.write_page('https://www.example.org/empty', 'Empty', []) == 0
+    writer.close()
+    # Not published yet: chunks/ only appears once the run is complete
+    assert not (tmp_path / ChunkShardWriter.DIRNAME).exists()
+    writer.publish()
+    
+    index, shards = read_shards(tmp_path / ChunkShardWriter.DIRNAME)
+    assert len(shards) > 1 and index['shards'][0]['file'].endswith('.jsonl.gz' if compress else '.jsonl')
+    assert index['max_tokens'] == 32 and index['pages'] == 12
+    shard_of = {}
+    for number, records in enumerate(shards):
+        for record in records:
+            # A page never spans two shards
+            assert shard_of.setdefault(record['url'], number) == number
+    for records in shards:
+        for url in {record['url'] for record in records}:
+            page = [record for record in records if record['url'] == url]
+            assert [record['chunk'] for record in page] == list(range(page[0]['chunks']))
+
+
+def test_publish_replaces_previous_set_and_drops_interrupted_one(tmp_path):
+    chunks = MarkdownChunker(32, 0).chunks(words(20))
+    writer = ChunkShardWriter(tmp_path)
+    writer.write_page('https://www.example.org/old', 'Old', chunks)
+    writer.close()
+    writer.publish()
+    
+    # An interrupted run leaves chunks.partial/ behind and chunks/ untouched
+    writer = ChunkShardWriter(tmp_path)
+    writer.write_page('https://www.example.org/interrupted', 'Interrupted', chunks)
+    writer._close_shard()
+    assert read_shards(tmp_path / ChunkShardWriter.DIRNAME)[1][0][0]['url'] == 'https://www.example.org/old'
+    
+    writer = ChunkShardWriter(tmp_path)
+    writer.write_page('https://www.example.org/new', 'New', chunks)
+    writer.close()
+    writer.publish()
+    _, shards = read_shards(tmp_path / ChunkShardWriter.DIRNAME)
+    assert {record['url'] for records in shards for record in records} == {'https://www.example.org/new'}
+    assert sorted(p.name for p in tmp_path.iterdir()) == [ChunkShardWriter.DIRNAME]
+
+
+def test_run_with_chunks(tmp_path, convert):
+    chunker = MarkdownChunker(128, 16)
+    with FixtureServer(per_shape=1) as server:
+        converter = convert(tmp_path, server.sitemap_url, chunker=chunker, chunk_shard_mb=0.05)
+        urls = server.page_urls
+    summary = converter.file_manager.metadata['chunks']
+    index, shards = read_shards(tmp_path / ChunkShardWriter.DIRNAME)
+    records = [record for shard in shards for record in shard]
+    assert summary['records'] == len(records) and summary['pages'] == len(urls) and summary['shards'] > 1
+    assert {record['url'] for record in records} == set(urls)
+    assert all(record['tokens'] <= 128 for record in records)
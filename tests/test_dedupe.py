@@ -0,0 +1,156 @@
+"""--dedupe: near-duplicate signatures and the alias threshold, learned site boilerplate"""
+
+import json
+
+import pytest
+from bs4 import BeautifulSoup
+
+from corpus import regional_site
+from fixture_server import FixtureServer
+from markdown_converter import NearDuplicateIndex, SiteBoilerplate
+
+SITE = 'www.example.org'
+WORDS = ('versicherte erhalten beratung zu leistungen vorsorge pflege familie zahnersatz krankengeld '
+         'reha kur impfung hilfsmittel arznei krankenhaus aufenthalt zuzahlung befreiung bonus programm').split()
+
+
+def text(variant: int = 0, words: int = 200) -> str:
+    """A page text; variants only differ in one region name every 40 words"""
+    out = [WORDS[(i * 7 + i // len(WORDS)) % len(WORDS)] + str(i % 13) for i in range(words)]
+    for i in range(0, words, 40):
+        out[i] = f'region{variant}'
+    return ' '.join(out)
+
+
+def test_signature_similarity():
+    assert NearDuplicateIndex.signature('too short to compare') is None
+    a, b = NearDuplicateIndex.signature(text(0)), NearDuplicateIndex.signature(text(1))
+    assert NearDuplicateIndex.similarity(a, a) == 1.0
+    assert 0.8 <= NearDuplicateIndex.similarity(a, b) < 1.0
+    other = NearDuplicateIndex.signature(' '.join(reversed(text(0).split())))
+    assert NearDuplicateIndex.similarity(a, other) < 0.3
+
+
+def test_alias_threshold(tmp_path):
+    a, b = NearDuplicateIndex.signature(text(0)), NearDuplicateIndex.signature(text(1))
+    similarity = NearDuplicateIndex.similarity(a, b)
+    index = NearDuplicateIndex(tmp_path / 'at.sqlite', threshold=similarity)
+    index.add(SITE, 'https://www.example.org/a', a)
+    assert index.find(SITE, 'https://www.example.org/b', b) == ('https://www.example.org/a', similarity)
+    # A page never matches itself, and other sites are not compared against
+    assert index.find(SITE, 'https://www.example.org/a', a) is None
+    assert index.find('other.example.org', 'https://other.example.org/b', b) is None
+    index.close()
+    
+    index = NearDuplicateIndex(tmp_path / 'above.sqlite', threshold=similarity + 1 / NearDuplicateIndex.SIGNATURE_SIZE)
+    index.add(SITE, 'https://www.example.org/a', a)
+    assert index.find(SITE, 'https://www.example.org/b', b) is None
+    index.close()
+
+
+def test_aliases_are_not_originals(tmp_path):
+    signatures = [NearDuplicateIndex.signature(text(i)) for i in range(3)]
+    index = NearDuplicateIndex(tmp_path / 'nd.sqlite', threshold=0.5)
+    index.add(SITE, 'https://www.example.org/0', signatures[0])
+    index.add(SITE, 'https://www.example.org/1', signatures[1], alias_of='https://www.example.org/0')
+    # The third page matches the original, never the alias
+    assert index.find(SITE, 'https://www.example.org/2', signatures[2])[0] == 'https://www.example.org/0'
+    index.close()
+
+
+def test_sweep_drops_aliases_of_forgotten_originals(tmp_path):
+    path = tmp_path / 'nd.sqlite'
+    a, b = NearDuplicateIndex.signature(text(0)), NearDuplicateIndex.signature(text(1))
+    index = NearDuplicateIndex(path)
+    index.add(SITE, 'https://www.example.org/a', a)
+    index.add(SITE, 'https://www.example.org/b', b, alias_of='https://www.example.org/a')
+    index.close()
+    
+    # Next run: the original left the sitemap, the alias is still there
+    index = NearDuplicateIndex(path)
+    index.touch('https://www.example.org/b')
+    assert index.sweep() == 1
+    assert not index.has('https://www.example.org/a')
+    assert not index.has('https://www.example.org/b')
+    index.close()
+
+
+def page(body: str) -> BeautifulSoup:
+    return BeautifulSoup(f'<html><body><main>{body}</main></body></html>', 'lxml')
+
+
+SERVICE = '<div class="box"><h3>Ihr persönlicher Service</h3><p>Montag bis Freitag von 8 bis 18 Uhr erreichbar.</p></div>'
+
+
+def blocks_of(body: str):
+    soup = page(body)
+    return set(SiteBoilerplate.block_hashes(soup.body).values())
+
+
+def test_boilerplate_learned_from_repeated_blocks(tmp_path):
+    learner = SiteBoilerplate(tmp_path / 'boilerplate.json', learn_pages=5)
+    for i in range(4):
+        learner.learn(SITE, blocks_of(f'<p>Artikel {i}: ein ganz eigener Text ohne Wiederholung.</p>{SERVICE}'))
+        assert learner.blocks_for(SITE) is None
+    learner.learn(SITE, blocks_of(f'<p>Artikel 4: ein ganz eigener Text ohne Wiederholung.</p>'))
+    learned = learner.blocks_for(SITE)
+    assert learned == blocks_of(SERVICE)
+    
+    soup = page(f'<p>Neuer Artikel mit einem Text, der bleiben muss.</p>{SERVICE}')
+    assert SiteBoilerplate.strip(soup.body, SiteBoilerplate.block_hashes(soup.body), learned) == 1
+    assert 'Service' not in soup.get_text() and 'bleiben muss' in soup.get_text()
+    
+    learner.save()
+    assert SiteBoilerplate(tmp_path / 'boilerplate.json').blocks_for(SITE) == learned
+
+
+def test_boilerplate_share_and_minimum_pages(tmp_path):
+    learner = SiteBoilerplate(learn_pages=10, min_share=0.5)
+    for i in range(6):
+        # On 2 of 6 pages: below half
+        extra = SERVICE if i < 2 else ''
+        learner.learn(SITE, blocks_of(f'<p>Artikel {i}: ein ganz eigener Text ohne Wiederholung.</p>{extra}'))
+    for i in range(SiteBoilerplate.MIN_PAGES - 1):
+        learner.learn('small.example.org', blocks_of(SERVICE))
+    learner.finish()
+    assert learner.blocks_for(SITE) == frozenset()
+    # Too few pages to tell boilerplate from content: not learned at all
+    assert learner.blocks_for('small.example.org') is None
+
+
+ARTICLES, REGIONS = 6, 3
+
+
+@pytest.fixture(scope='module')
+def regional():
+    with FixtureServer(0, extra_pages=regional_site(ARTICLES, REGIONS)) as server:
+        yield server
+
+
+def test_dedupe_run_records_aliases(regional, tmp_path, convert):
+    converter = convert(tmp_path, regional.sitemap_url, dedupe=True, dedupe_learn_pages=5)
+    stats = converter.file_manager.metadata['stats']
+    assert stats['failed'] == 0
+    # Pages converted while the site is learned still carry the boilerplate, so a stripped
+    # copy of their article may not match them yet; most regions become aliases already
+    assert 0 < stats['aliases'] <= ARTICLES * (REGIONS - 1)
+    # Learned from the converted pages only (aliases would count their article's blocks again)
+    learned = json.loads((tmp_path / 'boilerplate.json').read_text(encoding='utf-8'))
+    assert list(learned) == [SiteBoilerplate.site_for(regional.page_urls[0])]
+    
+    # Next run: every page is compared with the boilerplate stripped; one page per article is
+    # left, the other regions are its aliases and their outputs from the first run are removed
+    extra = ARTICLES * (REGIONS - 1) - stats['aliases']
+    stats = convert(tmp_path, regional.sitemap_url, dedupe=True, dedupe_learn_pages=5).file_manager.metadata['stats']
+    assert stats['aliases'] == ARTICLES * (REGIONS - 1) and stats['failed'] == 0
+    assert stats['removed'] == extra
+    assert len(list(tmp_path.glob('*.md'))) == ARTICLES
+    for path in tmp_path.glob('*.md'):
+        markdown = path.read_text(encoding='utf-8')
+        assert 'Ihr persönlicher Service' not in markdown
+        assert 'Was gilt in' in markdown
+    
+    # A warm run converts nothing
+    stats = convert(tmp_path, regional.sitemap_url, dedupe=True, dedupe_learn_pages=5).file_manager.metadata['stats']
+    assert stats['aliases'] == ARTICLES * (REGIONS - 1)
+    assert stats['successful'] - stats['unchanged'] - stats['aliases'] == 0
@@ -0,0 +1,139 @@
+"""Failure handling of the fetch ladder against the fixture server: circuit breaker, throttling, budgets"""
+
+import time
+
+import pytest
+
+from fixture_server import FaultProfile, FixtureServer
+from markdown_converter import DementorHTMLFetcher, HostCircuitBreaker, HostPoliteness
+
+COOLDOWN = 0.3
+
+
+def make_fetcher(breaker: HostCircuitBreaker, backend: str = 'pooled', url_budget: float = 0) -> DementorHTMLFetcher:
+    fetcher = DementorHTMLFetcher(HostPoliteness(initial_rate=0, max_rate=0), backend=backend, breaker=breaker,
+                                  url_budget=url_budget)
+    # No browser fallback: a page the HTTP strategies cannot get fails right away
+    fetcher.strategies['puppeteer'] = lambda *args: None
+    return fetcher
+
+
+def breaker_state(breaker: HostCircuitBreaker, url: str) -> str:
+    return breaker.summary()[HostPoliteness.host_for(url)]['state']
+
+
+@pytest.fixture
+def server():
+    with FixtureServer(per_shape=1) as server:
+        yield server
+
+
+def trip(fetcher: DementorHTMLFetcher, server: FixtureServer, url: str):
+    server.faults = FaultProfile(error_rate=1.0)
+    assert fetcher.fetch(url) is None
+    assert breaker_state(fetcher.breaker, url) == HostCircuitBreaker.OPEN
+
+
+def test_breaker_recovers_after_cooldown(server):
+    breaker = HostCircuitBreaker(threshold=1, cooldown=COOLDOWN)
+    fetcher = make_fetcher(breaker)
+    url = server.page_urls[0]
+    trip(fetcher, server, url)
+    
+    server.faults = FaultProfile()
+    # Still open: rejected without a request
+    assert fetcher.fetch(url) is None
+    assert 'Circuit open' in fetcher.failure_reason()
+    
+    time.sleep(COOLDOWN + 0.05)
+    result = fetcher.fetch(url)
+    assert result is not None and result.body
+    assert breaker_state(breaker, url) == HostCircuitBreaker.CLOSED
+    assert fetcher.fetch(url) is not None
+    fetcher.close()
+
+
+def test_failed_probe_doubles_cooldown(server):
+    breaker = HostCircuitBreaker(threshold=1, cooldown=COOLDOWN)
+    fetcher = make_fetcher(breaker)
+    url = server.page_urls[0]
+    trip(fetcher, server, url)
+    
+    time.sleep(COOLDOWN + 0.05)
+    assert fetcher.fetch(url) is None
+    assert breaker_state(breaker, url) == HostCircuitBreaker.OPEN
+    # The first cooldown would have passed by now, the doubled one has not
+    server.faults = FaultProfile()
+    time.sleep(COOLDOWN + 0.05)
+    assert fetcher.fetch(url) is None
+    assert 'Circuit open' in fetcher.failure_reason()
+    fetcher.close()
+
+
+def test_throttled_probe_releases_half_open(server):
+    breaker = HostCircuitBreaker(threshold=1, cooldown=COOLDOWN)
+    fetcher = make_fetcher(breaker)
+    url = server.page_urls[0]
+    trip(fetcher, server, url)
+    
+    time.sleep(COOLDOWN + 0.05)
+    server.faults = FaultProfile(rate_429=1.0, retry_after=0)
+    assert fetcher.fetch(url) is None
+    assert 'Throttled' in fetcher.failure_reason()
+    # Not stuck half-open: back to open, and the next probe goes out after another cooldown
+    assert breaker_state(breaker, url) == HostCircuitBreaker.OPEN
+    
+    server.faults = FaultProfile()
+    time.sleep(COOLDOWN + 0.05)
+    assert fetcher.fetch(url) is not None
+    assert breaker_state(breaker, url) == HostCircuitBreaker.CLOSED
+    fetcher.close()
+
+
+def test_raising_probe_releases_half_open(server):
+    breaker = HostCircuitBreaker(threshold=1, cooldown=COOLDOWN)
+    fetcher = make_fetcher(breaker)
+    url = server.page_urls[0]
+    trip(fetcher, server, url)
+    
+    time.sleep(COOLDOWN + 0.05)
+    ladder = fetcher._fetch_ladder
+    fetcher._fetch_ladder = lambda *args: (_ for _ in ()).throw(RuntimeError('worker died'))
+    with pytest.raises(RuntimeError):
+        fetcher.fetch(url)
+    assert breaker_state(breaker, url) == HostCircuitBreaker.OPEN
+    
+    fetcher._fetch_ladder = ladder
+    server.faults = FaultProfile()
+    time.sleep(COOLDOWN + 0.05)
+    assert fetcher.fetch(url) is not None
+    fetcher.close()
+
+
+class ImpatientFetcher(DementorHTMLFetcher):
+    """Gives every curl call a fraction of a second, so a slow server times it out"""
+    
+    def _run_cmd(self, cmd, timeout=40):
+        return super()._run_cmd(cmd, timeout=0.2)
+
+
+def test_curl_timeout_without_url_budget(server):
+    fetcher = ImpatientFetcher(HostPoliteness(initial_rate=0, max_rate=0), backend='curl',
+                               breaker=HostCircuitBreaker(threshold=1, cooldown=60), url_budget=0)
+    fetcher.strategies['puppeteer'] = lambda *args: None
+    url = server.page_urls[0]
+    server.faults = FaultProfile(latency_ms=1000)
+    # A curl timeout with --url-budget 0 is a plain failure, not a crash on the missing deadline
+    assert fetcher.fetch(url) is None
+    assert 'budget' not in fetcher.failure_reason()
+    assert breaker_state(fetcher.breaker, url) == HostCircuitBreaker.OPEN
+    fetcher.close()
+
+
+def test_server_errors_are_not_retried_blindly(server):
+    fetcher = make_fetcher(HostCircuitBreaker(threshold=0))
+    server.faults = FaultProfile(error_rate=1.0)
+    assert fetcher.fetch(server.page_urls[0]) is None
+    # One request per strategy (pooled, pooled-insecure), no urllib3 retries hidden behind them
+    assert server.stats.get('500') == 2
+    fetcher.close()
@@ -0,0 +1,53 @@
+"""Output file names: collisions are resolved through the build manifest"""
+
+import sqlite3
+
+from markdown_converter import BuildManifest, FileManager
+
+
+def save(manager: FileManager, url: str) -> str:
+    return manager.save_markdown(f'# {url}\n', url)
+
+
+def test_colliding_urls_get_suffixed_names(tmp_path):
+    manager = FileManager(str(tmp_path))
+    names = [manager.url_to_filename(url) for url in ('https://example.org/a?x=1', 'https://example.org/a?x=2')]
+    # Nothing written yet: both still map to the free base name
+    assert names == ['example-org-a.md', 'example-org-a.md']
+    save(manager, 'https://example.org/a?x=1')
+    save(manager, 'https://example.org/a?x=2')
+    assert manager.url_to_filename('https://example.org/a?x=1') == 'example-org-a.md'
+    assert manager.url_to_filename('https://example.org/a?x=2') == 'example-org-a-1.md'
+    manager.close()
+    
+    # The manifest keeps the names across runs, nothing is loaded into memory up front
+    manager = FileManager(str(tmp_path), resume=True)
+    assert manager.url_to_filename('https://example.org/a?x=2') == 'example-org-a-1.md'
+    save(manager, 'https://example.org/a?x=3')
+    assert manager.url_to_filename('https://example.org/a?x=3') == 'example-org-a-2.md'
+    manager.close()
+
+
+def test_names_are_unique_across_shard_directories(tmp_path):
+    manager = FileManager(str(tmp_path), shard_depth=2)
+    first, second = 'https://example.org/b?page=1', 'https://example.org/b?page=2'
+    save(manager, first)
+    save(manager, second)
+    names = {manager.url_to_filename(url).rsplit('/', 1)[1] for url in (first, second)}
+    assert names == {'example-org-b.md', 'example-org-b-1.md'}
+    manager.close()
+
+
+def test_manifest_without_name_column_is_upgraded(tmp_path):
+    path = tmp_path / 'build_manifest.sqlite'
+    conn = sqlite3.connect(str(path))
+    conn.execute('CREATE TABLE pages (url TEXT PRIMARY KEY, raw_hash TEXT, config_hash TEXT, filename TEXT,'
+                 ' size INTEGER, updated_at TEXT, last_seen_run TEXT)')
+    conn.execute("INSERT INTO pages VALUES ('https://example.org/c', '', '', '3f/a2/example-org-c.md', 1, '', '')")
+    conn.commit()
+    conn.close()
+    
+    manifest = BuildManifest(path)
+    assert manifest.owner_of('example-org-c.md') == 'https://example.org/c'
+    assert manifest.owner_of('example-org-d.md') is None
+    manifest.close()
@@ -0,0 +1,125 @@
+"""merge: combining --shard K/N outputs, rejecting incomplete or mixed sets, sweeping on a full merge"""
+
+import contextlib
+import io
+import json
+import shutil
+
+import pytest
+
+from fixture_server import FixtureServer
+from markdown_converter import DementorMarkdownConverter, FileManager, merge_shards, shard_dirname, shard_for_url
+
+SHARDS = 2
+
+
+@pytest.fixture(scope='module')
+def sharded_run(tmp_path_factory):
+    """Outputs of a 2-way sharded run over a multi-host site, converted once for the module"""
+    output = tmp_path_factory.mktemp('sharded')
+    with FixtureServer(per_shape=2, hosts=4) as server:
+        for index in range(1, SHARDS + 1):
+            converter = DementorMarkdownConverter(str(output), concurrency=4, initial_rate=0, max_rate=0,
+                                                  shard=(index, SHARDS))
+            with contextlib.redirect_stdout(io.StringIO()):
+                converter.convert_sitemap(server.sitemap_url)
+        urls = server.page_urls
+    return output, urls
+
+
+@pytest.fixture
+def output(sharded_run, tmp_path):
+    """A fresh copy of the sharded run's output directory"""
+    shutil.copytree(sharded_run[0], tmp_path, dirs_exist_ok=True)
+    return tmp_path
+
+
+def merge(output, **options):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return merge_shards(str(output), **options)
+
+
+def test_each_shard_converts_the_hosts_it_owns(sharded_run):
+    output, urls = sharded_run
+    converted = []
+    for index in range(1, SHARDS + 1):
+        metadata = json.loads((output / shard_dirname((index, SHARDS)) / 'metadata.json').read_text(encoding='utf-8'))
+        shard_urls = [entry['url'] for entry in metadata['files']]
+        assert all(shard_for_url(url, SHARDS) == index for url in shard_urls)
+        converted += shard_urls
+    assert sorted(converted) == sorted(urls)
+
+
+def test_merge_combines_every_shard(sharded_run, output):
+    summary = merge(output)
+    urls = sharded_run[1]
+    assert summary['shards'] == SHARDS
+    assert summary['pages'] == len(urls)
+    assert summary['failed'] == summary['missing'] == summary['removed'] == 0
+    metadata = json.loads((output / 'metadata.json').read_text(encoding='utf-8'))
+    assert sorted(entry['url'] for entry in metadata['files']) == sorted(urls)
+    for entry in metadata['files']:
+        assert (output / entry['filename']).exists()
+    assert metadata['stats']['total_urls'] == len(urls)
+    
+    # Merging again is idempotent
+    assert merge(output)['pages'] == len(urls)
+    metadata = json.loads((output / 'metadata.json').read_text(encoding='utf-8'))
+    assert len(metadata['files']) == len(urls)
+
+
+def test_missing_shard_is_rejected(output):
+    shutil.rmtree(output / shard_dirname((2, SHARDS)))
+    with pytest.raises(ValueError, match='missing'):
+        merge(output)
+    summary = merge(output, partial=True)
+    assert summary['shards'] == 1
+
+
+def test_mixed_splits_are_rejected(output):
+    other = output / shard_dirname((1, 3))
+    shutil.copytree(output / shard_dirname((1, SHARDS)), other)
+    metadata = json.loads((other / 'metadata.json').read_text(encoding='utf-8'))
+    metadata['shard'] = {'index': 1, 'count': 3}
+    (other / 'metadata.json').write_text(json.dumps(metadata), encoding='utf-8')
+    with pytest.raises(ValueError, match='different splits'):
+        merge(output)
+
+
+def test_shard_given_twice_is_rejected(output):
+    first = str(output / shard_dirname((1, SHARDS)))
+    with pytest.raises(ValueError, match='more than once'):
+        merge(output, shard_dirs=[first, first, str(output / shard_dirname((2, SHARDS)))])
+
+
+def test_plain_output_is_not_a_shard(output, tmp_path_factory):
+    plain = tmp_path_factory.mktemp('plain')
+    (plain / 'metadata.json').write_text(json.dumps({'stats': {}}), encoding='utf-8')
+    with pytest.raises(ValueError, match='not the output of a --shard run'):
+        merge(output, shard_dirs=[str(plain)])
+
+
+def add_stale_page(output) -> str:
+    """A page an earlier merge left behind that no shard has any more"""
+    manager = FileManager(str(output))
+    filename = manager.url_to_filename('https://gone.example.org/old.html')
+    manager.save_markdown('# Old page\n', 'https://gone.example.org/old.html')
+    manager.close()
+    return filename
+
+
+def test_full_merge_sweeps_pages_no_shard_has(output, tmp_path_factory):
+    merge(output)
+    files = [entry['filename'] for entry in json.loads((output / 'metadata.json').read_text(encoding='utf-8'))['files']]
+    filename = add_stale_page(output)
+    
+    # Without shard 2 its pages are not "gone": a partial merge keeps every page
+    aside = tmp_path_factory.mktemp('aside') / 'shard'
+    shutil.move(str(output / shard_dirname((2, SHARDS))), str(aside))
+    assert merge(output, partial=True)['removed'] == 0
+    assert all((output / name).exists() for name in files + [filename])
+    
+    shutil.move(str(aside), str(output / shard_dirname((2, SHARDS))))
+    assert merge(output)['removed'] == 1
+    assert not (output / filename).exists()
+    assert all((output / name).exists() for name in files)
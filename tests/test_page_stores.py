@@ -0,0 +1,128 @@
+"""Page stores: codec variants of DirectoryStore, eviction on top of them, segment index recovery"""
+
+import gzip
+
+from markdown_converter import DirectoryStore, RawHTMLCache, SegmentPageStore
+
+KEY = 'raw_html/example.org/page.html'
+LEGACY = b'<html><body>legacy plain copy</body></html>'
+FRESH = b'<html><body>fresh copy</body></html>' * 50
+
+
+def legacy_store(tmp_path) -> DirectoryStore:
+    """A store whose raw HTML was written plain by an older run, reopened with compression"""
+    DirectoryStore(tmp_path, codec='none').put_bytes(KEY, LEGACY)
+    store = DirectoryStore(tmp_path, codec='gzip')
+    assert store.get_bytes(KEY) == LEGACY
+    return store
+
+
+def test_compressed_rewrite_replaces_legacy_plain_file(tmp_path):
+    store = legacy_store(tmp_path)
+    store.put_bytes(KEY, FRESH)
+    assert not (tmp_path / KEY).exists()
+    assert (tmp_path / (KEY + '.gz')).exists()
+    assert list(store.keys()) == [KEY]
+    assert store.get_bytes(KEY) == FRESH
+
+
+def test_delete_removes_every_encoding(tmp_path):
+    store = legacy_store(tmp_path)
+    # Both copies on disk, e.g. left behind by a run that crashed mid-rewrite
+    (tmp_path / (KEY + '.gz')).write_bytes(gzip.compress(FRESH))
+    assert list(store.keys()) == [KEY]
+    assert store.delete(KEY)
+    assert store.get_bytes(KEY) is None
+    assert not store.exists(KEY)
+    assert list(store.keys()) == []
+    assert not store.delete(KEY)
+
+
+def test_move_leaves_no_stale_copy(tmp_path):
+    store = legacy_store(tmp_path)
+    (tmp_path / (KEY + '.gz')).write_bytes(gzip.compress(FRESH))
+    assert store.move(KEY, 'raw_html/example.org/moved.html')
+    assert store.get_bytes(KEY) is None
+    assert store.get_bytes('raw_html/example.org/moved.html') == FRESH
+
+
+def test_eviction_after_codec_upgrade(tmp_path):
+    store = legacy_store(tmp_path)
+    other = 'raw_html/example.org/other.html'
+    store.put_bytes(other, LEGACY)
+    # The index is seeded from the legacy files, then the page is rewritten compressed
+    cache = RawHTMLCache(store, tmp_path / 'cache.sqlite')
+    cache.put(KEY, FRESH)
+    assert sorted(store.keys()) == sorted([KEY, other])
+    assert cache.total_bytes == store.size(KEY) + store.size(other)
+    
+    # Room for one page only: the least recently used one goes, in every encoding
+    cache.get(other)
+    cache.max_bytes = store.size(other)
+    cache.put(other, LEGACY)
+    assert cache.stats['evictions'] == 1
+    assert store.get_bytes(KEY) is None
+    assert cache.get(KEY) is None
+    assert list(store.keys()) == [other]
+
+
+def crash(store: SegmentPageStore):
+    """Drops the store like a killed process would: nothing uncommitted reaches the index"""
+    store._file.close()
+    store._conn.close()
+
+
+def test_segment_index_catches_up_after_crash(tmp_path):
+    store = SegmentPageStore(tmp_path, codec='gzip')
+    store.put_bytes('committed.md', b'first')
+    store.delete('committed.md')
+    store.put_bytes('kept.md', b'kept')
+    store.close()
+    
+    store = SegmentPageStore(tmp_path, codec='gzip')
+    for i in range(5):
+        store.put_bytes(f'page-{i}.md', f'page {i}'.encode())
+    store.put_bytes('kept.md', b'rewritten')
+    crash(store)
+    
+    store = SegmentPageStore(tmp_path, codec='gzip')
+    assert sorted(store.keys()) == ['kept.md'] + [f'page-{i}.md' for i in range(5)]
+    assert store.get_bytes('kept.md') == b'rewritten'
+    assert store.get_bytes('page-4.md') == b'page 4'
+    # Deleted before the last commit: the rescan starts after it and does not bring it back
+    assert not store.exists('committed.md')
+    store.close()
+
+
+def test_segment_torn_record_is_cut_off(tmp_path):
+    store = SegmentPageStore(tmp_path, codec='none')
+    store.put_bytes('whole.md', b'whole record')
+    store.put_bytes('torn.md', b'x' * 100)
+    crash(store)
+    segment = next((tmp_path / SegmentPageStore.DIRNAME).glob('segment-*.seg'))
+    with open(segment, 'r+b') as f:
+        f.truncate(segment.stat().st_size - 10)
+    
+    store = SegmentPageStore(tmp_path, codec='none')
+    assert list(store.keys()) == ['whole.md']
+    store.put_bytes('after.md', b'written after the torn record')
+    crash(store)
+    
+    store = SegmentPageStore(tmp_path, codec='none')
+    assert sorted(store.keys()) == ['after.md', 'whole.md']
+    assert store.get_bytes('after.md') == b'written after the torn record'
+    store.close()
+
+
+def test_segment_index_rebuilt_when_lost(tmp_path):
+    store = SegmentPageStore(tmp_path, codec='gzip')
+    store.put_bytes('a.md', b'a')
+    store.put_bytes('b.md', b'b')
+    store.put_bytes('a.md', b'a again')
+    store.close()
+    (tmp_path / SegmentPageStore.DIRNAME / 'index.sqlite').unlink()
+    
+    store = SegmentPageStore(tmp_path, codec='gzip')
+    assert sorted(store.keys()) == ['a.md', 'b.md']
+    assert store.get_bytes('a.md') == b'a again'
+    store.close()
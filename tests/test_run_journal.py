@@ -0,0 +1,94 @@
+"""Run journal and --resume: torn lines, latest outcome per URL, outputs kept across a resumed run"""
+
+import json
+
+from fixture_server import FixtureServer
+from markdown_converter import RunJournal
+
+
+def test_torn_last_line_is_skipped(tmp_path):
+    path = tmp_path / 'run_journal.jsonl'
+    journal = RunJournal(path)
+    journal.record('https://example.org/a', 'ok', filename='a.md')
+    journal.record('https://example.org/b', 'failed', reason='HTTP 500')
+    journal.close()
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"url": "https://example.org/c", "status": "o')
+    
+    journal = RunJournal(path, resume=True)
+    assert journal.resumed_from == 1
+    assert journal.is_completed('https://example.org/a')
+    assert not journal.is_completed('https://example.org/b')
+    assert not journal.is_completed('https://example.org/c')
+    # New records still start on a line of their own
+    journal.record('https://example.org/c', 'ok', filename='c.md')
+    journal.close()
+    
+    journal = RunJournal(path, resume=True)
+    assert journal.resumed_from == 2
+    assert journal.is_completed('https://example.org/c')
+    journal.close()
+
+
+def test_unterminated_complete_last_line_is_kept(tmp_path):
+    path = tmp_path / 'run_journal.jsonl'
+    path.write_text('{"url": "https://example.org/a", "status": "ok"}', encoding='utf-8')
+    journal = RunJournal(path, resume=True)
+    journal.record('https://example.org/b', 'ok', filename='b.md')
+    journal.close()
+    journal = RunJournal(path, resume=True)
+    assert journal.resumed_from == 2
+    journal.close()
+
+def test_latest_outcome_per_url_wins(tmp_path):
+    path = tmp_path / 'run_journal.jsonl'
+    journal = RunJournal(path)
+    journal.record('https://example.org/a', 'failed', reason='timeout')
+    journal.record('https://example.org/b', 'ok', filename='b.md')
+    journal.record('https://example.org/a', 'ok', filename='a.md')
+    journal.record('https://example.org/c', 'alias', alias_of='https://example.org/b', similarity=0.9)
+    journal.record('https://example.org/b', 'failed', reason='HTTP 503')
+    journal.close()
+    
+    journal = RunJournal(path, resume=True)
+    assert journal.is_completed('https://example.org/a')
+    assert not journal.is_completed('https://example.org/b')
+    assert journal.is_completed('https://example.org/c')
+    assert [r['url'] for r in journal.iter_records(*RunJournal.COMPLETED)] == ['https://example.org/a']
+    assert [r['reason'] for r in journal.iter_records('failed')] == ['HTTP 503']
+    journal.close()
+
+
+def test_run_without_resume_starts_a_new_journal(tmp_path):
+    path = tmp_path / 'run_journal.jsonl'
+    journal = RunJournal(path)
+    journal.record('https://example.org/a', 'ok', filename='a.md')
+    journal.close()
+    journal = RunJournal(path)
+    assert journal.resumed_from == 0
+    assert not journal.is_completed('https://example.org/a')
+    journal.close()
+    assert path.read_text(encoding='utf-8') == ''
+
+
+def test_resume_after_crash_keeps_completed_outputs(tmp_path, convert):
+    with FixtureServer(per_shape=2) as server:
+        convert(tmp_path, server.sitemap_url)
+        journal_path = tmp_path / 'run_journal.jsonl'
+        lines = journal_path.read_text(encoding='utf-8').splitlines()
+        assert len(lines) == len(server.page_urls)
+        # A run killed after four pages, halfway through writing the fifth line
+        journal_path.write_text('\n'.join(lines[:4]) + '\n' + lines[4][:30], encoding='utf-8')
+        
+        converter = convert(tmp_path, server.sitemap_url, resume=True)
+    stats = converter.file_manager.metadata['stats']
+    assert stats['resumed'] == 4
+    # (unchanged pages count as successful too)
+    assert stats['successful'] == len(server.page_urls) - 4
+    assert stats['failed'] == 0
+    # Resumed pages were not converted again, and their outputs survived the stale-output sweep
+    assert stats['removed'] == 0
+    metadata = json.loads((tmp_path / 'metadata.json').read_text(encoding='utf-8'))
+    assert sorted(entry['url'] for entry in metadata['files']) == sorted(server.page_urls)
+    for entry in metadata['files']:
+        assert (tmp_path / entry['filename']).exists()
@@ -0,0 +1,39 @@
+"""Strategy ordering: exploration never starts with an insecure or browser strategy"""
+
+import random
+
+import pytest
+
+from markdown_converter import DementorHTMLFetcher, StrategyScoreboard
+
+URL = 'https://www.example.org/page.html'
+
+
+@pytest.mark.parametrize('backend', sorted(DementorHTMLFetcher.BACKENDS))
+def test_exploration_never_probes_puppeteer(monkeypatch, backend):
+    ladder = DementorHTMLFetcher.BACKENDS[backend]
+    # Always explore
+    monkeypatch.setattr(random, 'random', lambda: 0.0)
+    scoreboard = StrategyScoreboard()
+    for _ in range(50):
+        ordered = scoreboard.order(URL, ladder, no_probe=DementorHTMLFetcher.NO_PROBE_STRATEGIES)
+        assert ordered[0] not in DementorHTMLFetcher.NO_PROBE_STRATEGIES
+        assert sorted(ordered) == sorted(ladder)
+
+
+def test_default_ladder_is_not_reordered_without_scores(monkeypatch):
+    monkeypatch.setattr(random, 'random', lambda: 0.0)
+    ladder = DementorHTMLFetcher.BACKENDS['pooled']
+    # pooled-insecure and puppeteer are the only candidates behind pooled: nothing to explore
+    assert StrategyScoreboard().order(URL, ladder, no_probe=DementorHTMLFetcher.NO_PROBE_STRATEGIES) == ladder
+
+
+def test_puppeteer_moves_up_on_its_own_scores(monkeypatch):
+    monkeypatch.setattr(random, 'random', lambda: 1.0)
+    ladder = DementorHTMLFetcher.BACKENDS['pooled']
+    scoreboard = StrategyScoreboard()
+    for _ in range(10):
+        scoreboard.record(URL, 'pooled', False, 1.0)
+        scoreboard.record(URL, 'pooled-insecure', False, 1.0)
+        scoreboard.record(URL, 'puppeteer', True, 2.0)
+    assert scoreboard.order(URL, ladder, no_probe=DementorHTMLFetcher.NO_PROBE_STRATEGIES)[0] == 'puppeteer'